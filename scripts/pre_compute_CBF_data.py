@@ -1,9 +1,29 @@
+"""
+Precompute the CBF feature bundle (data/precomputed_CBF) from games_master_data.csv.
+
+    python scripts/pre_compute_CBF_data.py                # full rebuild
+    python scripts/pre_compute_CBF_data.py --incremental  # re-encode new/changed games only
+
+The incremental mode reuses the rows of games whose feature inputs are
+unchanged since the previous bundle, and falls back to a full rebuild when the
+label vocabulary or the numeric scaler range has changed.
+"""
+
+import argparse
+import hashlib
 import pandas as pd
+import os
+import sys
 import numpy as np
+from scipy.sparse import csr_matrix, diags, hstack, vstack
 from sklearn.preprocessing import MultiLabelBinarizer, MinMaxScaler
-import pickle
 import warnings
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from id_index import IdIndex  # noqa: E402
+from cbf_bundle import BLOCK_WEIGHTS, LABEL_FAMILIES, NUMERIC_COLUMNS, load_cbf_bundle, save_cbf_bundle  # noqa: E402
+
 warnings.filterwarnings('ignore')
 
 
@@ -24,10 +44,16 @@ def semicolon_to_list(value):
     return [item.strip() for item in value_str.split(';') if item.strip()]
 
 
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--incremental", action="store_true",
+                    help="only re-encode games that are new or changed since the existing bundle")
+args = parser.parse_args()
+
 # -----------------------------
 # Load CSV
 # -----------------------------
 games_file = "data/games_master_data.csv"
+bundle_dir = "data/precomputed_CBF"
 
 usecols = [
     'bgg_id', 'name', 'description', 'image', 'thumbnail', 'bgg_link',
@@ -65,6 +91,9 @@ games_df.rename(
     inplace=True
 )
 
+# canonical row order shared with the catalog and the CF store: sorted by bgg_id, one row per game
+games_df = games_df.sort_values('bgg_id', kind='stable').drop_duplicates('bgg_id').reset_index(drop=True)
+
 # -----------------------------
 # Clean multi-label columns
 # -----------------------------
@@ -76,46 +105,121 @@ for col in ['game_weight', 'players_best', 'time_avg']:
     games_df[col] = games_df[col].fillna(0)
 
 
+
 # -----------------------------
-# Create MultiLabelBinarizer encoders
+# Encoding helpers
 # -----------------------------
-mlb_game_categories = MultiLabelBinarizer()
-mlb_game_mechanics = MultiLabelBinarizer()
-mlb_game_types = MultiLabelBinarizer()
+def fingerprint_rows(df):
+    """64-bit hash of each game's feature-relevant fields (labels and numeric inputs)."""
+    fingerprints = np.empty(len(df), dtype=np.uint64)
+    columns = [df[family] for family in LABEL_FAMILIES] + [df[col] for col in NUMERIC_COLUMNS]
+    for i, values in enumerate(zip(*columns)):
+        labels = values[:len(LABEL_FAMILIES)]
+        numeric = values[len(LABEL_FAMILIES):]
+        key = "|".join(";".join(sorted(v)) for v in labels) + "|" + ";".join(repr(float(v)) for v in numeric)
+        fingerprints[i] = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return fingerprints
 
-cat_features = mlb_game_categories.fit_transform(games_df['game_categories'])
-mech_features = mlb_game_mechanics.fit_transform(games_df['game_mechanics'])
-type_features = mlb_game_types.fit_transform(games_df['game_types'])
 
-# -----------------------------
-# Scale numeric features
-# -----------------------------
-scaler = MinMaxScaler()
-numeric_features = scaler.fit_transform(games_df[['game_weight', 'players_best', 'time_avg']])
+def fit_vocabularies(df):
+    """Sorted label vocabulary of each family (same column order MultiLabelBinarizer uses)."""
+    return {
+        family: sorted({label for labels in df[family] for label in labels})
+        for family in LABEL_FAMILIES
+    }
+
+
+def fit_scaler(df):
+    scaler = MinMaxScaler()
+    scaler.fit(df[NUMERIC_COLUMNS].to_numpy())
+    return scaler.min_.astype(np.float32), scaler.scale_.astype(np.float32)
+
+
+def encode_rows(df, vocabularies, scaler_min, scaler_scale):
+    """
+    Weighted, row-L2-normalized features of the games in df: returns the CSR
+    label blocks and the dense numeric block.
+    """
+    # mostly-zero multi-hot blocks stay sparse, the numeric block is dense
+    label_blocks = []
+    for family in LABEL_FAMILIES:
+        mlb = MultiLabelBinarizer(classes=vocabularies[family], sparse_output=True)
+        label_blocks.append(mlb.fit_transform(df[family]) * BLOCK_WEIGHTS[family])
+    label_features = hstack(label_blocks).tocsr().astype(np.float32)
+
+    numeric_features = df[NUMERIC_COLUMNS].to_numpy(dtype=np.float64) * scaler_scale + scaler_min
+    numeric_features = (numeric_features * BLOCK_WEIGHTS['numeric']).astype(np.float32)
+
+    # L2-normalize each row over both blocks so cosine similarity is a plain dot product
+    row_norms = np.sqrt(
+        np.asarray(label_features.multiply(label_features).sum(axis=1)).ravel()
+        + (numeric_features ** 2).sum(axis=1)
+    )
+    row_norms[row_norms == 0] = 1.0
+    features_csr = csr_matrix(diags(1 / row_norms) @ label_features, dtype=np.float32)
+    numeric_features = numeric_features / row_norms[:, None].astype(np.float32)
+    return features_csr, numeric_features
+
 
 # -----------------------------
-# Combine features (weighted)
+# Fit vocabularies and scaler, then encode
 # -----------------------------
-weighted_features = np.hstack([
-    cat_features * 1.5,
-    mech_features * 2.0,
-    type_features * 1.0,
-    numeric_features * 0.5
-])
+bgg_ids = games_df['bgg_id'].to_numpy()
+fingerprints = fingerprint_rows(games_df)
+vocabularies = fit_vocabularies(games_df)
+scaler_min, scaler_scale = fit_scaler(games_df)
+
+previous = None
+if args.incremental and os.path.exists(os.path.join(bundle_dir, "manifest.json")):
+    try:
+        previous = load_cbf_bundle(bundle_dir, mmap_mode=None)
+    except ValueError:
+        print("Existing bundle is in another format, doing a full rebuild.")
+
+if previous is not None:
+    if previous.fingerprints is None:
+        print("Existing bundle has no fingerprints, doing a full rebuild.")
+        previous = None
+    elif previous.vocabularies != vocabularies:
+        print("Label vocabulary changed, doing a full rebuild.")
+        previous = None
+    elif not (np.array_equal(previous.scaler_min, scaler_min) and np.array_equal(previous.scaler_scale, scaler_scale)):
+        print("Numeric scaler range changed, doing a full rebuild.")
+        previous = None
+
+if previous is None:
+    features_csr, numeric_features = encode_rows(games_df, vocabularies, scaler_min, scaler_scale)
+    print(f"Encoded all {len(games_df)} games.")
+else:
+    # reuse rows of games whose fingerprint is unchanged, re-encode the rest
+    previous_rows = IdIndex(previous.bgg_ids).lookup(bgg_ids)
+    unchanged = previous_rows >= 0
+    unchanged[unchanged] = previous.fingerprints[previous_rows[unchanged]] == fingerprints[unchanged]
+    changed = np.flatnonzero(~unchanged)
+    kept = np.flatnonzero(unchanged)
+
+    new_csr, new_numeric = encode_rows(games_df.iloc[changed], vocabularies, scaler_min, scaler_scale)
+    stacked_csr = vstack([previous.features_csr[previous_rows[kept]], new_csr]).tocsr()
+    stacked_numeric = np.vstack([previous.numeric_features[previous_rows[kept]], new_numeric])
+
+    # stacked rows are [kept..., changed...]; put them back in catalog order
+    order = np.argsort(np.concatenate([kept, changed]), kind="stable")
+    features_csr = stacked_csr[order]
+    numeric_features = stacked_numeric[order]
+    print(f"Re-encoded {len(changed)} new or changed games, reused {len(kept)}.")
 
 # -----------------------------
 # Save precomputed data
 # -----------------------------
-precompute_data = {
-    'games_df': games_df,
-    'mlb_game_categories': mlb_game_categories,
-    'mlb_game_mechanics': mlb_game_mechanics,
-    'mlb_game_types': mlb_game_types,
-    'scaler': scaler,
-    'weighted_features': weighted_features
-}
-
-with open('precomputed_CBF.pkl', 'wb') as f:
-    pickle.dump(precompute_data, f)
+save_cbf_bundle(
+    bundle_dir,
+    bgg_ids=bgg_ids,
+    features_csr=features_csr,
+    numeric_features=numeric_features,
+    scaler_min=scaler_min,
+    scaler_scale=scaler_scale,
+    vocabularies=vocabularies,
+    fingerprints=fingerprints,
+)
 
-print("Precomputed CBF data saved to 'precomputed_CBF.pkl'.")
+print(f"Precomputed CBF data saved to '{bundle_dir}'.")
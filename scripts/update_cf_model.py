@@ -0,0 +1,89 @@
+"""
+Apply a batch of new ratings to the CF item embeddings without a full retrain.
+
+The batch is a CSV with the user_ratings.csv columns (Username, BGGId, Rating)
+holding only the new rows. Only the affected users and the games they rated
+are recomputed, and the result is written as a new versioned artifact that
+src/cf.py can load like data/V_final_quantized.npz.
+
+Updates chain: by default the newest V_final_quantized_v*.npz in --output-dir
+is the starting point (data/V_final_quantized.npz if there is none yet), and an
+existing version file is never overwritten.
+
+Models written by train_cf_als.py carry the training BM25 statistics and user
+Gram matrix: the new ratings are BM25-weighted like the training ratings and
+each updated game is held near its previous vector by the training users. They
+are copied unchanged into every new version until the next retrain.
+
+The affected users are folded in from their rows in the batch only, not from
+their earlier ratings in data/user_ratings.csv, so a user with a long history
+counts like a new user with just the new ratings. Run train_cf_als.py
+periodically to fold the full history back in.
+
+Run from the project root:
+
+    python scripts/update_cf_model.py new_ratings.csv
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cf_als import (  # noqa: E402
+    incremental_update,
+    latest_version_path,
+    load_quantized,
+    load_ratings_matrix,
+    load_train_stats,
+    save_quantized,
+)
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("delta", help="CSV of new ratings (Username, BGGId, Rating)")
+parser.add_argument("--model", default=None,
+                    help="starting model (default: newest version in --output-dir, else data/V_final_quantized.npz)")
+parser.add_argument("--games", default="data/games.csv")
+parser.add_argument("--output-dir", default="data/cf_versions")
+parser.add_argument("--regularization", type=float, default=0.03)
+parser.add_argument("--alpha", type=float, default=160)
+parser.add_argument("--gamma", type=float, default=3.0)
+parser.add_argument("--anchor", type=float, default=10.0,
+                    help="prior strength for models saved without training statistics")
+parser.add_argument("--steps", type=int, default=2)
+args = parser.parse_args()
+
+model_path = args.model or latest_version_path(args.output_dir) or "data/V_final_quantized.npz"
+t0 = time.perf_counter()
+V, version = load_quantized(model_path)
+output_path = os.path.join(args.output_dir, f"V_final_quantized_v{version + 1:04d}.npz")
+if os.path.exists(output_path):
+    sys.exit(f"'{output_path}' already exists; pass --model with the newest version to chain from it.")
+train_stats = load_train_stats(model_path)
+print(f"Updating version {version} from '{model_path}'")
+if train_stats is None:
+    print("The model has no training statistics (retrain it with train_cf_als.py); "
+          f"using unweighted ratings and --anchor {args.anchor}.")
+item_ids = pd.read_csv(args.games, usecols=["BGGId"])["BGGId"].to_numpy()
+R_delta, usernames, _ = load_ratings_matrix(args.delta, item_ids=item_ids, min_user_ratings=1)
+print(f"Loaded {R_delta.nnz} new ratings from {len(usernames)} users")
+
+V_new, touched_items, _ = incremental_update(
+    V,
+    R_delta,
+    regularization=args.regularization,
+    alpha=args.alpha,
+    gamma=args.gamma,
+    anchor=args.anchor,
+    n_steps=args.steps,
+    train_stats=train_stats,
+)
+
+os.makedirs(args.output_dir, exist_ok=True)
+save_quantized(V_new, output_path, version=version + 1, train_stats=train_stats)
+print(f"Updated {len(touched_items)} games in {time.perf_counter() - t0:.1f}s, "
+      f"saved version {version + 1} to '{output_path}'.")
@@ -4,7 +4,11 @@ from typing import Optional
 import streamlit as st
 import pandas as pd
 from openai import OpenAI
-from model_ensemble import ensemble_scores
+from model_ensemble import cached_ensemble_scores
+from result_cache import ResultCache
+from component_store import ComponentStore
+from cf import create_fold_in_state
+from catalog import get_catalog
 
 # ========= COLOR PALETTE =========
 BACKGROUND_COLOR = "#12241C"         # Dark green for main background
@@ -24,6 +28,13 @@ PLACEHOLDER_TEXT = "rgba(60, 60, 60, 0.6)"  # Placeholder gray
 st.set_page_config(page_title="Board Game Recommender", layout="wide")
 client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 n_games = 5 
+latency_budget = 15.0  # seconds the recommenders may take before slow ones are dropped
+
+
+@st.cache_resource
+def get_result_cache():
+    # shared by all sessions, persisted so identical searches survive app restarts
+    return ResultCache(max_size=512, ttl=24 * 3600, disk_dir="./data/result_cache")
 
 # ========= CUSTOM CSS =========
 CUSTOM_STYLE = f"""
@@ -251,7 +262,9 @@ st.markdown("---")
 # --- Load data ---
 @st.cache_data
 def load_data():
-    return pd.read_csv("./data/games.csv")
+    # name picker over the shared game catalog
+    catalog_df = get_catalog().games_df
+    return pd.DataFrame({"BGGId": catalog_df["bgg_id"].to_numpy(), "Name": catalog_df["name"].to_numpy()})
 
 @st.cache_data
 def load_mechanics():
@@ -268,8 +281,10 @@ def load_game_types():
     game_types_df = pd.read_csv("./data/game_types.csv", header=None, names=["type"])
     return game_types_df["type"].dropna().sort_values().tolist()
 
-@st.cache_data
-def load_master_assets():
+@st.cache_data(max_entries=256)
+def load_master_assets(bgg_ids):
+    # images, links and descriptions come from the catalog's side store, so only
+    # the recommended games are read
     cols = [
         "bgg_id",
         "thumbnail",
@@ -284,10 +299,8 @@ def load_master_assets():
         "description",
         "full_description",
     ]
-    master_df = pd.read_csv(
-        "./data/games_master_data.csv",
-        usecols=lambda column: column in cols,
-    )
+    catalog = get_catalog()
+    master_df = catalog.frame(catalog.id_index.rows_for(bgg_ids), cols).reset_index(drop=True)
     master_df["bgg_id"] = pd.to_numeric(master_df["bgg_id"], errors="coerce").astype("Int64")
     master_df.dropna(subset=["bgg_id"], inplace=True)
     master_df["asset_url"] = (
@@ -306,11 +319,10 @@ def load_master_assets():
     return master_df.set_index("bgg_id")
 
 games_df = load_data()
-games_lookup = games_df.set_index("BGGId")
+games_lookup = get_catalog().games_df
 mechanics_options = load_mechanics()
 categories_options = load_categories()
 game_type_options = load_game_types()
-master_assets = load_master_assets()
 DEFAULT_THUMBNAIL = "https://images.pexels.com/photos/411207/pexels-photo-411207.jpeg?auto=compress&cs=tinysrgb&h=320&w=320"
 CARD_GRID_STYLE = f"""
 <style>
@@ -431,6 +443,10 @@ CARD_GRID_STYLE = f"""
 </style>
 """
 
+if "cf_fold_in_state" not in st.session_state:
+    st.session_state["cf_fold_in_state"] = create_fold_in_state()
+if "component_store" not in st.session_state:
+    st.session_state["component_store"] = ComponentStore()
 if "recommendations" not in st.session_state:
     st.session_state["recommendations"] = None
 if "recommendation_reason" not in st.session_state:
@@ -623,7 +639,7 @@ if selected_model:
 
     #with st.spinner(f"Generating recommendations (Model {selected_model}: α={alpha}, β={beta})..."):
     with st.spinner("Generating recommendations..."):
-        recommendations = ensemble_scores(
+        recommendations = cached_ensemble_scores(
             liked_games=[] if not liked_games else games_df.loc[games_df["Name"].isin(liked_games), "BGGId"].tolist(),
             disliked_games=[] if not disliked_games else games_df.loc[games_df["Name"].isin(disliked_games), "BGGId"].tolist(),
             exclude_games=[],
@@ -632,11 +648,18 @@ if selected_model:
             n_recommendations=n_games,
             alpha=alpha,
             beta=beta,
+            cf_state=st.session_state["cf_fold_in_state"],
+            component_store=st.session_state["component_store"],
+            latency_budget=latency_budget,
+            cache=get_result_cache(),
         )
 
     if not isinstance(recommendations, pd.DataFrame):
         recommendations = pd.DataFrame()
 
+    if description and recommendations.attrs.get("scorer_status", {}).get("llm", "ok") != "ok":
+        st.sidebar.caption("The description search was unavailable and was skipped for these results.")
+
     st.session_state["recommendations"] = recommendations
     st.session_state["recommendation_reason"] = None
     st.session_state["game_insights"] = {}
@@ -658,6 +681,7 @@ elif isinstance(recommendations_df, pd.DataFrame) and recommendations_df.empty:
     st.warning("No recommendations found. Try adjusting your filters or description.")
 elif isinstance(recommendations_df, pd.DataFrame):
     recommendations_df = recommendations_df.reset_index(drop=True)
+    master_assets = load_master_assets(tuple(int(bgg_id) for bgg_id in recommendations_df["bgg_id"]))
     recommendations_df = recommendations_df.merge(
         master_assets, left_on="bgg_id", right_index=True, how="left", suffixes=("", "_asset")
     )
@@ -750,9 +774,6 @@ elif isinstance(recommendations_df, pd.DataFrame):
                 details = details.iloc[0]
             play_time_display = derive_playtime(details) or play_time_display
             players_display = derive_players(details) or players_display
-            details_description = details.get("Description")
-        else:
-            details_description = None
 
         insight_key = int(bgg_id) if pd.notna(bgg_id) else title
         insight_text = st.session_state["game_insights"].get(insight_key)
@@ -766,7 +787,6 @@ elif isinstance(recommendations_df, pd.DataFrame):
             _clean_description(row.get("game_description"))
             or _clean_description(row.get("description"))
             or _clean_description(row.get("description_asset"))
-            or _clean_description(details_description)
         )
 
         if insight_text is None:
@@ -0,0 +1,379 @@
+"""
+catalog.py
+The game catalog (games_master_data.csv), loaded once per process.
+
+The ensemble, the LLM scorer and the app all read the same GameCatalog. Rows
+are sorted by bgg_id; model artifacts (CF store, CBF bundle) must use the same
+row order, which check_aligned verifies when they are loaded.
+
+Only what filtering and ranking touch is held in memory, in compact form:
+
+    games_df    bgg_id (index and column), name and the numeric columns,
+                integers downcast to int16 / int32 and floats to float32
+    labels      categories, mechanics and game types as LabelColumns: the
+                distinct labels once, plus CSR offset / index arrays
+    side store  descriptions and image / link URLs, kept on disk next to the
+                CSV (see SideStore) and read only for the rows details() asks for
+
+frame(rows, columns) rebuilds the usual DataFrame (label lists, 64-bit
+numbers, side columns) for the handful of rows a page actually shows. Run
+this module to print the memory used before and after.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from filters import FilterEngine
+from id_index import IdIndex
+from label_index import LabelIndex
+
+CATALOG_PATH = "./data/games_master_data.csv"
+
+HOT_COLUMNS = [
+    'bgg_id', 'name', 'avg_rating', 'bgg_rating', 'users_rated', 'game_weight',
+    'players_min', 'players_max', 'players_best', 'time_min', 'time_max', 'time_avg', 'year_published',
+]
+SIDE_COLUMNS = ['description', 'full_description', 'image', 'thumbnail', 'ImagePath', 'bgg_link']
+# label column -> its csv column
+LABEL_SOURCES = {
+    'game_categories': 'simple_game_categories',
+    'game_mechanics': 'simple_game_mechanics',
+    'game_types': 'game_types',
+}
+LABEL_COLUMNS = list(LABEL_SOURCES)
+NUMERIC_COLUMNS = [
+    'avg_rating', 'bgg_rating', 'users_rated', 'game_weight', 'players_min', 'players_max',
+    'players_best', 'time_min', 'time_max', 'time_avg', 'year_published',
+]
+CSV_DTYPES = {
+    'bgg_id':        'int64',
+    'avg_rating':    'float64',
+    'bgg_rating':    'float64',
+    'users_rated':   'int64',
+    'game_weight':   'float64',
+    'players_min':   'int64',
+    'players_max':   'int64',
+    'players_best':  'float64',
+    'time_min':      'int64',
+    'time_max':      'int64',
+    'time_avg':      'int64',
+}
+
+
+def semicolon_to_list(value):
+    if pd.isna(value) or value == "":
+        return []
+    if isinstance(value, list):  # prevent double conversion
+        return value
+    return [item.strip() for item in str(value).split(';') if item.strip()]
+
+
+def compact_numeric(series):
+    """Integer series downcast to int16 / int32 where the values fit, float series to float32."""
+    if pd.api.types.is_integer_dtype(series.dtype):
+        for dtype in (np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if series.empty or (series.min() >= info.min and series.max() <= info.max):
+                return series.astype(dtype)
+        return series
+    if pd.api.types.is_float_dtype(series.dtype):
+        return series.astype(np.float32)
+    return series
+
+
+class LabelColumn:
+    """Multi-label column as CSR arrays: row i carries vocabulary[indices[offsets[i]:offsets[i + 1]]]."""
+
+    def __init__(self, vocabulary, offsets, indices):
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        self.offsets = offsets
+        self.indices = indices
+
+    @classmethod
+    def from_lists(cls, values):
+        vocabulary = sorted({label for labels in values for label in labels})
+        label_ids = {label: i for i, label in enumerate(vocabulary)}
+        offsets = np.zeros(len(values) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(labels) for labels in values])
+        indices = np.fromiter((label_ids[label] for labels in values for label in labels),
+                              dtype=np.int16 if len(vocabulary) <= np.iinfo(np.int16).max else np.int32,
+                              count=offsets[-1])
+        return cls(vocabulary, offsets, indices)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lists(self, rows):
+        """Label list of each of the given rows."""
+        return [self.vocabulary[self.indices[self.offsets[row]:self.offsets[row + 1]]].tolist() for row in rows]
+
+    def label_index(self):
+        return LabelIndex.from_csr(self.offsets, self.indices, self.vocabulary)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.indices.nbytes + sum(len(label) for label in self.vocabulary)
+
+
+class SideStore:
+    """
+    Text and URL columns of the catalog, stored per column on disk in catalog row order:
+
+        <column>.bin           utf-8 bytes of all values, concatenated
+        <column>_offsets.npy   int64 (n_games + 1,), value i is bin[offsets[i]:offsets[i + 1]]
+        <column>_null.npy      bool (n_games,), missing values
+        bgg_ids.npy            int64 (n_games,), BGGId of each row
+        manifest.json          format, columns and the size / mtime of the source CSV
+
+    The files are memory-mapped, so reading the values of k rows touches only
+    those rows' bytes. build() writes the store from the CSV; load_catalog does
+    it at startup whenever the CSV has changed.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.columns = self.manifest["columns"]
+        self.bgg_ids = np.load(os.path.join(store_dir, "bgg_ids.npy"))
+        self._values, self._offsets, self._nulls = {}, {}, {}
+        for column in self.columns:
+            bin_path = os.path.join(store_dir, f"{column}.bin")
+            # np.memmap can't map an empty file
+            self._values[column] = (
+                np.memmap(bin_path, dtype=np.uint8, mode="r") if os.path.getsize(bin_path) else np.empty(0, np.uint8)
+            )
+            self._offsets[column] = np.load(os.path.join(store_dir, f"{column}_offsets.npy"), mmap_mode="r")
+            self._nulls[column] = np.load(os.path.join(store_dir, f"{column}_null.npy"), mmap_mode="r")
+
+    @staticmethod
+    def _source_stat(csv_path):
+        stat = os.stat(csv_path)
+        return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+    @classmethod
+    def is_current(cls, store_dir, csv_path, bgg_ids):
+        """True if store_dir holds a store of this format built from csv_path as it is now, for bgg_ids."""
+        try:
+            with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format_version") != cls.FORMAT_VERSION:
+                return False
+            if any(manifest.get(key) != value for key, value in cls._source_stat(csv_path).items()):
+                return False
+            return np.array_equal(np.load(os.path.join(store_dir, "bgg_ids.npy")), bgg_ids)
+        except (OSError, ValueError):
+            return False
+
+    @classmethod
+    def build(cls, store_dir, csv_path, bgg_ids):
+        """Write the side columns of csv_path for the games bgg_ids, in that order."""
+        side_df = pd.read_csv(
+            csv_path,
+            usecols=lambda column: column == 'bgg_id' or column in SIDE_COLUMNS,
+            dtype={'bgg_id': 'int64'},
+            encoding="utf-8-sig",
+        )
+        side_df = side_df.drop_duplicates('bgg_id').set_index('bgg_id').reindex(bgg_ids)
+        columns = [column for column in SIDE_COLUMNS if column in side_df.columns]
+
+        # written to a temp directory and swapped in, so readers never see a partial store
+        tmp_dir = f"{store_dir.rstrip(os.sep)}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "bgg_ids.npy"), np.asarray(bgg_ids, dtype=np.int64))
+        for column in columns:
+            nulls = side_df[column].isna().to_numpy()
+            encoded = [b"" if null else str(value).encode("utf-8") for value, null in zip(side_df[column], nulls)]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(value) for value in encoded])
+            with open(os.path.join(tmp_dir, f"{column}.bin"), "wb") as f:
+                f.write(b"".join(encoded))
+            np.save(os.path.join(tmp_dir, f"{column}_offsets.npy"), offsets)
+            np.save(os.path.join(tmp_dir, f"{column}_null.npy"), nulls)
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"format_version": cls.FORMAT_VERSION, "columns": columns, "n_games": len(bgg_ids),
+                       **cls._source_stat(csv_path)}, f, indent=2)
+
+        old_dir = f"{store_dir.rstrip(os.sep)}.{os.getpid()}.old"
+        if os.path.exists(store_dir):
+            os.replace(store_dir, old_dir)
+        os.replace(tmp_dir, store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def values(self, column, rows):
+        """Values of column for the given rows, NaN where missing."""
+        values, offsets, nulls = self._values[column], self._offsets[column], self._nulls[column]
+        return [
+            np.nan if nulls[row] else bytes(values[offsets[row]:offsets[row + 1]]).decode("utf-8")
+            for row in rows
+        ]
+
+
+def side_store_dir(csv_path):
+    return f"{os.path.splitext(csv_path)[0]}_side"
+
+
+class GameCatalog:
+    """Compact games table, label columns, BGGId -> row mapping and the on-disk side store."""
+
+    def __init__(self, games_df, labels, path=CATALOG_PATH, side_store=None):
+        self.games_df = games_df
+        self.labels = labels
+        self.path = path
+        self.side_store = side_store
+        self.bgg_ids = games_df['bgg_id'].to_numpy()
+        self.columns = {column: games_df[column].to_numpy() for column in NUMERIC_COLUMNS if column in games_df}
+        self.id_index = IdIndex(self.bgg_ids)
+        if not self.id_index.is_sorted:
+            raise ValueError("catalog rows must be sorted by bgg_id")
+        self._filter_engine = None
+        self._fingerprint = None
+
+    @property
+    def n_games(self):
+        return len(self.bgg_ids)
+
+    @property
+    def fingerprint(self):
+        """Hex digest of the catalog contents that recommendations depend on (ids, names, numbers, labels)."""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.ascontiguousarray(self.bgg_ids).tobytes())
+            digest.update(pd.util.hash_pandas_object(self.games_df['name'], index=False).to_numpy().tobytes())
+            for column in sorted(self.columns):
+                digest.update(column.encode() + np.ascontiguousarray(self.columns[column]).tobytes())
+            for column in sorted(self.labels):
+                labels = self.labels[column]
+                digest.update(column.encode() + "\x1f".join(labels.vocabulary).encode())
+                digest.update(labels.offsets.tobytes() + labels.indices.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def rows_for(self, bgg_ids):
+        """Catalog rows of the given BGGIds, unknown ids dropped."""
+        return self.id_index.rows_for(bgg_ids)
+
+    def check_aligned(self, name, artifact_ids):
+        """Fail fast if an artifact's rows are not the catalog's games in catalog order."""
+        self.id_index.check_aligned(name, artifact_ids)
+
+    @property
+    def filter_engine(self):
+        if self._filter_engine is None:
+            label_indexes = {column: labels.label_index() for column, labels in self.labels.items()}
+            self._filter_engine = FilterEngine.from_columns(self.n_games, self.columns, label_indexes)
+        return self._filter_engine
+
+    def frame(self, rows, columns):
+        """
+        DataFrame indexed by bgg_id of the given rows and columns: label columns
+        as lists, numbers as int64 / float64, side columns read from the side store.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        frame = self.games_df.iloc[rows][[column for column in columns if column in self.games_df.columns]]
+        frame = frame.astype({
+            column: np.int64 if pd.api.types.is_integer_dtype(dtype) else np.float64
+            for column, dtype in frame.dtypes.items() if pd.api.types.is_numeric_dtype(dtype)
+        })
+        side_columns = [column for column in columns if column in SIDE_COLUMNS]
+        if side_columns:
+            details = self.details(rows, side_columns)
+            for column in details.columns:
+                frame[column] = details[column].to_numpy()
+        for column in columns:
+            if column in self.labels:
+                frame[column] = self.labels[column].lists(rows)
+        return frame[[column for column in columns if column in frame.columns]]
+
+    def details(self, rows, columns=None):
+        """Side store columns (descriptions, URLs) of the given rows, indexed by bgg_id."""
+        rows = np.asarray(rows, dtype=np.int64)
+        available = self.side_store.columns if self.side_store is not None else []
+        columns = [column for column in (columns or SIDE_COLUMNS) if column in available]
+        return pd.DataFrame(
+            {column: self.side_store.values(column, rows) for column in columns},
+            index=pd.Index(self.bgg_ids[rows], name='bgg_id'),
+            columns=columns,
+            dtype=object,
+        )
+
+
+def _read_games(path, columns):
+    return pd.read_csv(
+        path,
+        usecols=lambda column: column in columns,
+        converters={column: semicolon_to_list for column in LABEL_SOURCES.values()},
+        dtype=CSV_DTYPES,
+        encoding="utf-8-sig",
+    )
+
+
+def load_catalog(path=CATALOG_PATH):
+    games_df = _read_games(path, HOT_COLUMNS + list(LABEL_SOURCES.values()))
+    # canonical row order: sorted by bgg_id, one row per game
+    games_df = games_df.sort_values('bgg_id', kind='stable').drop_duplicates('bgg_id')
+
+    labels = {
+        column: LabelColumn.from_lists(games_df[source].tolist())
+        for column, source in LABEL_SOURCES.items() if source in games_df.columns
+    }
+    games_df = games_df[[column for column in HOT_COLUMNS if column in games_df.columns]].apply(compact_numeric)
+    games_df = games_df.set_index("bgg_id", drop=False)
+
+    # text columns live on disk; (re)written here, at startup, when the CSV has changed
+    bgg_ids = games_df['bgg_id'].to_numpy(dtype=np.int64)
+    store_dir = side_store_dir(path)
+    if not SideStore.is_current(store_dir, path, bgg_ids):
+        SideStore.build(store_dir, path, bgg_ids)
+    return GameCatalog(games_df, labels, path=path, side_store=SideStore(store_dir))
+
+
+def memory_report(path=CATALOG_PATH):
+    """
+    Bytes held before (one DataFrame of every column, label lists, 64-bit
+    numbers) and after (compact games_df plus label arrays; the side store is
+    not counted since it stays on disk and only requested rows are read).
+    """
+    full_df = _read_games(path, HOT_COLUMNS + SIDE_COLUMNS + list(LABEL_SOURCES.values()))
+    before = int(full_df.memory_usage(deep=True).sum())
+    # memory_usage counts 8 bytes per list, not the list objects themselves
+    before += sum(
+        int(full_df[source].map(lambda labels: 56 + 8 * len(labels)).sum())
+        for source in LABEL_SOURCES.values() if source in full_df.columns
+    )
+
+    catalog = load_catalog(path)
+    games = int(catalog.games_df.memory_usage(deep=True).sum())
+    labels = sum(label_column.nbytes for label_column in catalog.labels.values())
+    return {"before": before, "after": games + labels, "games_df": games, "labels": labels}
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Process-wide game catalog, loaded on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = load_catalog()
+    return _catalog
+
+
+if __name__ == "__main__":
+    report = memory_report()
+    print(f"Catalog before: {report['before'] / 2**20:.1f} MiB")
+    print(f"Catalog after:  {report['after'] / 2**20:.1f} MiB "
+          f"(games_df {report['games_df'] / 2**20:.1f} MiB, labels {report['labels'] / 2**20:.2f} MiB)")
+    print(f"Saved:          {100 * (1 - report['after'] / report['before']):.0f}%")
@@ -1,21 +1,22 @@
 import numpy as np
-import pandas as pd
-import pickle
-from sklearn.metrics.pairwise import cosine_similarity
 import os
+from functools import lru_cache
 
-# load precomputed CBF data
+from cbf_bundle import BLOCK_WEIGHTS, LABEL_FAMILIES, load_cbf_bundle
+
+# load precomputed CBF data (memory-mapped, see cbf_bundle.py for the layout)
 base_dir = os.path.dirname(os.path.abspath(__file__))
-cbf_path = os.path.join(base_dir, "..", "data", "precomputed_CBF.pkl")
-with open(cbf_path, "rb") as f:
-    _cbf_data = pickle.load(f)
+cbf_path = os.path.join(base_dir, "..", "data", "precomputed_CBF")
+_cbf_bundle = load_cbf_bundle(cbf_path)
+
+bgg_ids = _cbf_bundle.bgg_ids
+n_games = _cbf_bundle.n_games
+manifest = _cbf_bundle.manifest
 
-games_df = _cbf_data["games_df"]
-mlb_game_categories = _cbf_data["mlb_game_categories"]
-mlb_game_mechanics = _cbf_data["mlb_game_mechanics"]
-mlb_game_types = _cbf_data["mlb_game_types"]
-scaler = _cbf_data["scaler"]
-weighted_features = _cbf_data["weighted_features"]  # use this as the feature matrix
+# feature matrix: row-L2-normalized float32 CSR of the weighted multi-hot blocks,
+# with the weighted numeric block (normalized with the same row norms) stored densely
+features_csr = _cbf_bundle.features_csr
+numeric_features = _cbf_bundle.numeric_features
 
 # get mean value
 def mean_or_default(value, default):
@@ -25,51 +26,159 @@ def mean_or_default(value, default):
         return value
     return default
 
-# get CBF scores
-def get_cbf_scores(attributes: dict):
-
-    n_games = games_df.shape[0]
-
-    # Build query vectors
-    cat_vec = mlb_game_categories.transform(
-        [attributes.get('game_categories', [])]
-    ) if 'game_categories' in attributes else np.zeros((1, len(mlb_game_categories.classes_)))
-
-    mech_vec = mlb_game_mechanics.transform(
-        [attributes.get('game_mechanics', [])]
-    ) if 'game_mechanics' in attributes else np.zeros((1, len(mlb_game_mechanics.classes_)))
-
-    type_vec = mlb_game_types.transform(
-        [attributes.get('game_types', [])]
-    ) if 'game_types' in attributes else np.zeros((1, len(mlb_game_types.classes_)))
-
-    # Numeric features
-    game_weight_avg = mean_or_default(attributes.get('game_weight'), 2.5)
-    players_avg = mean_or_default(attributes.get('players'), 3)
-    play_time_avg = mean_or_default(attributes.get('play_time'), 90)
-
-    numeric_vec = np.array([[game_weight_avg, players_avg, play_time_avg]])
-    numeric_vec_scaled = scaler.transform(numeric_vec)
-
-    # Combine feature vector (match weighted_features)
-    query_vector = np.hstack([
-        cat_vec * 1.5,
-        mech_vec * 2.0,
-        type_vec * 1.0,
-        numeric_vec_scaled * 0.5
-    ])
-
-    # compute similarity
-    cbf_scores = cosine_similarity(query_vector, weighted_features).flatten()
+class QueryEncoder:
+    """
+    Encodes an attributes dict into the query vectors matching features_csr /
+    numeric_features.
+
+    Label -> column lookups and block weights are resolved once from the bundle
+    vocabularies, min-max scaling is plain arithmetic, and encoded queries are
+    memoized in a bounded LRU keyed by the canonicalized attributes (sorted
+    unique labels, rounded numeric means), so repeated sidebar queries are free.
+    """
+
+    def __init__(self, vocabularies, scaler_min, scaler_scale, cache_size=1024):
+        # label -> column of the concatenated, weighted label query
+        self.label_columns = {}
+        self.label_weights = []
+        for family in LABEL_FAMILIES:
+            offset = len(self.label_weights)
+            self.label_columns[family] = {label: offset + i for i, label in enumerate(vocabularies[family])}
+            self.label_weights += [BLOCK_WEIGHTS[family]] * len(vocabularies[family])
+        self.label_weights = np.array(self.label_weights)
+        self.scaler_min = np.asarray(scaler_min, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self._encode_cached = lru_cache(maxsize=cache_size)(self._encode_key)
+
+    @staticmethod
+    def canonical_key(attributes: dict):
+        labels = tuple(
+            tuple(sorted({
+                label.strip() for label in attributes.get(family) or []
+                if isinstance(label, str) and label.strip()
+            }))
+            for family in LABEL_FAMILIES
+        )
+        numeric = (
+            round(float(mean_or_default(attributes.get('game_weight'), 2.5)), 4),
+            round(float(mean_or_default(attributes.get('players'), 3)), 4),
+            round(float(mean_or_default(attributes.get('play_time'), 90)), 4),
+        )
+        return labels, numeric
+
+    def _encode_key(self, key):
+        labels, numeric = key
+        label_query = np.zeros(len(self.label_weights))
+        for family, family_labels in zip(LABEL_FAMILIES, labels):
+            # labels unseen at precompute time are ignored
+            columns = self.label_columns[family]
+            label_query[[columns[label] for label in family_labels if label in columns]] = 1
+        label_query *= self.label_weights
+
+        numeric_query = (np.array(numeric) * self.scaler_scale + self.scaler_min) * BLOCK_WEIGHTS['numeric']
+        query_norm = np.sqrt(label_query @ label_query + numeric_query @ numeric_query)
+
+        # cached arrays are shared between callers
+        label_query.setflags(write=False)
+        numeric_query.setflags(write=False)
+        return label_query, numeric_query, query_norm
+
+    def encode(self, attributes: dict):
+        """(label_query, numeric_query, query_norm) for an attributes dict; arrays are read-only."""
+        return self._encode_cached(self.canonical_key(attributes or {}))
+
+    def cache_info(self):
+        return self._encode_cached.cache_info()
+
+query_encoder = QueryEncoder(_cbf_bundle.vocabularies, _cbf_bundle.scaler_min, _cbf_bundle.scaler_scale)
+
+# min-max normalize each row to [0, 1], constant rows become zeros
+def normalize_rows(scores):
+    lo = scores.min(axis=1, keepdims=True)
+    span = scores.max(axis=1, keepdims=True) - lo
+    return np.where(span > 0, (scores - lo) / np.where(span > 0, span, 1), 0)
+
+# get CBF scores, only for the candidate rows when given (all other games get 0)
+def get_cbf_scores(attributes: dict, candidates=None):
+
+    label_query, numeric_query, query_norm = query_encoder.encode(attributes)
+
+    # compute cosine similarity, catalog rows are already L2-normalized
+    if query_norm == 0 or (candidates is not None and len(candidates) == 0):
+        return np.zeros(n_games)
+    if candidates is None:
+        cbf_scores = (features_csr @ label_query + numeric_features @ numeric_query) / query_norm
+    else:
+        candidates = np.asarray(candidates, dtype=np.int64)
+        cbf_scores = (features_csr[candidates] @ label_query + numeric_features[candidates] @ numeric_query) / query_norm
 
-    # normalize
+    # normalize, a constant candidate set (e.g. a single game) all ranks first
     if cbf_scores.max() > cbf_scores.min():
         cbf_scores_norm = (cbf_scores - cbf_scores.min()) / (cbf_scores.max() - cbf_scores.min())
+    elif candidates is not None:
+        cbf_scores_norm = np.ones_like(cbf_scores)
     else:
         cbf_scores_norm = np.zeros_like(cbf_scores)
 
+    if candidates is not None:
+        full_scores = np.zeros(n_games)
+        full_scores[candidates] = cbf_scores_norm
+        cbf_scores_norm = full_scores
+
     return cbf_scores_norm
 
+# get CBF scores for many attribute profiles at once
+def get_cbf_scores_batch(list_of_attributes, top_k=None, block_size=256, normalize=True):
+    """
+    Score a list of attribute dicts against the catalog in one pass.
+
+    All profiles are encoded into one query matrix; similarities are computed
+    for block_size queries at a time, so at most a (block_size, n_games) block
+    is alive. Each row is normalized like get_cbf_scores, or left as raw
+    cosine similarities with normalize=False.
+
+    Returns a (n_queries, n_games) float32 array, or with top_k the pair
+    (rows, scores) of (n_queries, top_k) arrays holding the best catalog rows
+    per query in descending score order.
+    """
+    encoded = [query_encoder.encode(attributes) for attributes in list_of_attributes]
+    n_queries = len(encoded)
+    if n_queries == 0:
+        if top_k is None:
+            return np.empty((0, n_games), dtype=np.float32)
+        top_k = min(top_k, n_games)
+        return np.empty((0, top_k), dtype=np.int64), np.empty((0, top_k), dtype=np.float32)
+    label_queries = np.array([label for label, _, _ in encoded], dtype=np.float32).reshape(n_queries, -1)
+    numeric_queries = np.array([numeric for _, numeric, _ in encoded], dtype=np.float32).reshape(n_queries, -1)
+    query_norms = np.array([norm for _, _, norm in encoded], dtype=np.float32)
+
+    if top_k is None:
+        result = np.empty((n_queries, n_games), dtype=np.float32)
+    else:
+        top_k = min(top_k, n_games)
+        top_rows = np.empty((n_queries, top_k), dtype=np.int64)
+        top_scores = np.empty((n_queries, top_k), dtype=np.float32)
+
+    for start in range(0, n_queries, block_size):
+        stop = min(start + block_size, n_queries)
+        scores = np.asarray(features_csr @ label_queries[start:stop].T).T
+        scores += numeric_queries[start:stop] @ numeric_features.T
+        norms = query_norms[start:stop, None]
+        scores = np.where(norms > 0, scores / np.where(norms > 0, norms, 1), 0)
+        if normalize:
+            scores = normalize_rows(scores)
+
+        if top_k is None:
+            result[start:stop] = scores
+        else:
+            rows = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            row_scores = np.take_along_axis(scores, rows, axis=1)
+            order = np.argsort(-row_scores, axis=1)
+            top_rows[start:stop] = np.take_along_axis(rows, order, axis=1)
+            top_scores[start:stop] = np.take_along_axis(row_scores, order, axis=1)
+
+    return result if top_k is None else (top_rows, top_scores)
+
 if __name__ == "__main__":
     import pandas as pd
 
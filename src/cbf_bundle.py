@@ -0,0 +1,166 @@
+"""
+cbf_bundle.py
+On-disk format of the precomputed CBF data.
+
+A bundle is a directory of plain files that can be loaded memory-mapped and
+without sklearn or pickle:
+
+    manifest.json               format version, shapes, block weights and a
+                                sha256 checksum of every other file
+    bgg_ids.npy                 int64 (n_games,), BGGId of each feature row,
+                                sorted ascending (the catalog's row order)
+    features_data.npy           float32 \\
+    features_indices.npy        int32    > row-normalized CSR of the label blocks
+    features_indptr.npy         int64   /
+    numeric_features.npy        float32 (n_games, 3), numeric block, same row norms
+    scaler_min.npy              float32 (3,), MinMaxScaler min_
+    scaler_scale.npy            float32 (3,), MinMaxScaler scale_
+    vocab_<family>.json         column order of each label family's multi-hot block
+    fingerprints.npy            uint64 (n_games,), optional hash of each game's
+                                feature inputs, used for incremental rebuilds
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# bumped whenever the layout changes (2: rows sorted by BGGId)
+FORMAT_VERSION = 2
+LABEL_FAMILIES = ["game_categories", "game_mechanics", "game_types"]
+NUMERIC_COLUMNS = ["game_weight", "players_best", "time_avg"]
+BLOCK_WEIGHTS = {
+    "game_categories": 1.5,
+    "game_mechanics": 2.0,
+    "game_types": 1.0,
+    "numeric": 0.5,
+}
+
+
+class CBFBundle:
+    """Arrays and vocabularies of a loaded CBF bundle."""
+
+    def __init__(self, bgg_ids, features_csr, numeric_features, scaler_min, scaler_scale, vocabularies, manifest,
+                 fingerprints=None):
+        self.bgg_ids = bgg_ids
+        self.features_csr = features_csr
+        self.numeric_features = numeric_features
+        self.scaler_min = scaler_min
+        self.scaler_scale = scaler_scale
+        self.vocabularies = vocabularies
+        self.manifest = manifest
+        self.fingerprints = fingerprints
+
+    @property
+    def n_games(self):
+        return len(self.bgg_ids)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_cbf_bundle(bundle_dir, bgg_ids, features_csr, numeric_features, scaler_min, scaler_scale, vocabularies,
+                    fingerprints=None):
+    """
+    Write a bundle to bundle_dir, replacing any previous one.
+
+    The files are written to a sibling temp directory first and swapped in at
+    the end, so readers never see a half-written bundle.
+    """
+    tmp_dir = f"{bundle_dir.rstrip(os.sep)}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    features_csr = csr_matrix(features_csr)
+    arrays = {
+        "bgg_ids": np.asarray(bgg_ids, dtype=np.int64),
+        "features_data": features_csr.data.astype(np.float32),
+        "features_indices": features_csr.indices.astype(np.int32),
+        "features_indptr": features_csr.indptr.astype(np.int64),
+        "numeric_features": np.asarray(numeric_features, dtype=np.float32),
+        "scaler_min": np.asarray(scaler_min, dtype=np.float32),
+        "scaler_scale": np.asarray(scaler_scale, dtype=np.float32),
+    }
+    if fingerprints is not None:
+        arrays["fingerprints"] = np.asarray(fingerprints, dtype=np.uint64)
+
+    files = {}
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+        files[f"{name}.npy"] = None
+    for family in LABEL_FAMILIES:
+        with open(os.path.join(tmp_dir, f"vocab_{family}.json"), "w", encoding="utf-8") as f:
+            json.dump([str(label) for label in vocabularies[family]], f, ensure_ascii=False)
+        files[f"vocab_{family}.json"] = None
+    files = {name: _sha256(os.path.join(tmp_dir, name)) for name in files}
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "n_games": int(len(arrays["bgg_ids"])),
+        "features_shape": list(features_csr.shape),
+        "numeric_columns": NUMERIC_COLUMNS,
+        "block_weights": BLOCK_WEIGHTS,
+        "files": files,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = f"{bundle_dir.rstrip(os.sep)}.{os.getpid()}.old"
+    if os.path.exists(bundle_dir):
+        os.replace(bundle_dir, old_dir)
+    os.replace(tmp_dir, bundle_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def load_cbf_bundle(bundle_dir, mmap_mode="r", verify=False):
+    """
+    Load a bundle written by save_cbf_bundle.
+
+    Arrays are memory-mapped by default. With verify=True every file is
+    checked against the manifest checksums first, which reads the whole bundle.
+    """
+    with open(os.path.join(bundle_dir, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"{bundle_dir} has CBF bundle format {manifest.get('format_version')}, expected {FORMAT_VERSION}; "
+            "rebuild it with python scripts/pre_compute_CBF_data.py"
+        )
+    if verify:
+        for name, checksum in manifest["files"].items():
+            if _sha256(os.path.join(bundle_dir, name)) != checksum:
+                raise ValueError(f"checksum mismatch for {name} in {bundle_dir}")
+
+    def array(name):
+        return np.load(os.path.join(bundle_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    features_csr = csr_matrix(
+        (array("features_data"), array("features_indices"), array("features_indptr")),
+        shape=tuple(manifest["features_shape"]),
+        copy=False,
+    )
+    vocabularies = {}
+    for family in LABEL_FAMILIES:
+        with open(os.path.join(bundle_dir, f"vocab_{family}.json"), encoding="utf-8") as f:
+            vocabularies[family] = json.load(f)
+
+    return CBFBundle(
+        bgg_ids=array("bgg_ids"),
+        features_csr=features_csr,
+        numeric_features=array("numeric_features"),
+        scaler_min=np.load(os.path.join(bundle_dir, "scaler_min.npy")),
+        scaler_scale=np.load(os.path.join(bundle_dir, "scaler_scale.npy")),
+        vocabularies=vocabularies,
+        manifest=manifest,
+        fingerprints=array("fingerprints") if "fingerprints.npy" in manifest["files"] else None,
+    )
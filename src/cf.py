@@ -4,9 +4,201 @@ Collaborative Filtering model for board game recommendations.
 This module computes similarity based on user ratings.
 """
 
+import json
+import os
+import threading
+
 import pandas as pd
 import numpy as np
 
+from id_index import IdIndex
+
+CF_NPZ_PATH = "./data/V_final_quantized.npz"
+GAMES_PATH = "./data/games.csv"
+CF_STORE_DIR = "./data/cf_store"
+# bumped whenever the store layout changes; stores of another format are rebuilt
+# (2: rows sorted by BGGId)
+CF_STORE_FORMAT = 2
+
+
+class QuantizedEmbeddings:
+    """
+    int8 item embeddings with one float32 scale per row (V ~= V_q * row_scale[:, None]).
+
+    Supports the two operations the CF path needs without ever materializing a
+    float32 copy of the whole matrix: row gathers (for the fold-in) and V.dot(u),
+    which is computed block by block with the row scales folded in afterwards.
+    """
+
+    def __init__(self, V_q, row_scale, block_size=8192):
+        self.V_q = V_q
+        self.row_scale = row_scale
+        self.block_size = block_size
+
+    @classmethod
+    def quantize(cls, V, block_size=8192):
+        V = np.asarray(V, dtype=np.float32)
+        row_scale = np.abs(V).max(axis=1) / 127
+        row_scale[row_scale == 0] = 1.0
+        V_q = np.rint(V / row_scale[:, None]).astype(np.int8)
+        return cls(V_q, row_scale.astype(np.float32), block_size=block_size)
+
+    @property
+    def shape(self):
+        return self.V_q.shape
+
+    @property
+    def nbytes(self):
+        return self.V_q.nbytes + self.row_scale.nbytes
+
+    def __getitem__(self, rows):
+        return self.V_q[rows].astype(np.float32) * self.row_scale[rows][..., None]
+
+    def dot(self, u):
+        """V.dot(u) for a user vector (k,) or a matrix of user vectors (k, n_users)."""
+        u = np.asarray(u, dtype=np.float32)
+        n = self.V_q.shape[0]
+        scores = np.empty((n,) + u.shape[1:], dtype=np.float32)
+        for start in range(0, n, self.block_size):
+            stop = min(start + self.block_size, n)
+            scores[start:stop] = self.V_q[start:stop].astype(np.float32) @ u
+        scores *= self.row_scale.reshape((n,) + (1,) * (u.ndim - 1))
+        return scores
+
+
+class CFModelStore:
+    """
+    Read-only CF item embeddings plus the BGGId -> row mapping.
+
+    V is usually a memory-mapped float32 array, so every worker process shares
+    the same pages from the OS cache instead of holding its own copy. V_quantized
+    holds the same embeddings as int8 with per-row scales and is what requests
+    score against by default.
+    """
+
+    def __init__(self, V, bgg_ids, V_quantized=None, manifest=None):
+        self.V = V
+        self.V_quantized = V_quantized
+        self.bgg_ids = np.asarray(bgg_ids)
+        self.id_index = IdIndex(self.bgg_ids)
+        self.manifest = manifest or {}
+
+    @property
+    def n_items(self):
+        return self.V.shape[0]
+
+    def rows_for(self, bgg_ids):
+        """Map BGGIds to row numbers of V, silently dropping unknown ids."""
+        return self.id_index.rows_for(bgg_ids)
+
+
+def build_cf_store(npz_path=CF_NPZ_PATH, games_path=GAMES_PATH, store_dir=CF_STORE_DIR):
+    """
+    Convert the quantized npz + games.csv into the mmap-able store layout:
+
+        store_dir/V.npy            float32 (n_items, k), dequantized once
+        store_dir/V_q.npy          int8 (n_items, k), V re-quantized per row
+        store_dir/V_row_scale.npy  float32 (n_items,), scale of each row of V_q
+        store_dir/bgg_ids.npy      int64 (n_items,), BGGId of each row of V
+        store_dir/manifest.json    store format, row order and the npz it was built from
+
+    Rows are stored sorted by BGGId, the catalog's canonical order.
+    """
+    data = np.load(npz_path)
+    V = data["V_q"].astype(np.float32) / 127 * data["scale"]
+    bgg_ids = pd.read_csv(games_path, usecols=["BGGId"])["BGGId"].to_numpy(dtype=np.int64)
+
+    if len(bgg_ids) != V.shape[0]:
+        raise ValueError(
+            f"{games_path} has {len(bgg_ids)} games but {npz_path} has {V.shape[0]} item vectors"
+        )
+
+    order = np.argsort(bgg_ids, kind="stable")
+    V, bgg_ids = V[order], bgg_ids[order]
+
+    V_quantized = QuantizedEmbeddings.quantize(V)
+
+    os.makedirs(store_dir, exist_ok=True)
+    # write to temp files and rename so concurrent workers never see a partial store;
+    # V.npy goes last since its mtime marks the store as up to date, and the
+    # manifest after it since it marks the format
+    arrays = [
+        ("bgg_ids", bgg_ids),
+        ("V_q", V_quantized.V_q),
+        ("V_row_scale", V_quantized.row_scale),
+        ("V", V),
+    ]
+    for name, arr in arrays:
+        tmp_path = os.path.join(store_dir, f"{name}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, arr)
+        os.replace(tmp_path, os.path.join(store_dir, f"{name}.npy"))
+
+    npz_stat = os.stat(npz_path)
+    manifest = {
+        "format_version": CF_STORE_FORMAT,
+        "row_order": "bgg_id",
+        "n_items": int(V.shape[0]),
+        "source": os.path.abspath(npz_path),
+        "source_size": npz_stat.st_size,
+        "source_mtime_ns": npz_stat.st_mtime_ns,
+    }
+    tmp_path = os.path.join(store_dir, f"manifest.{os.getpid()}.tmp.json")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, "manifest.json"))
+
+
+def _read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _store_is_stale(store_dir, npz_path):
+    V_path = os.path.join(store_dir, "V.npy")
+    for name in ["V", "V_q", "V_row_scale", "bgg_ids"]:
+        if not os.path.exists(os.path.join(store_dir, f"{name}.npy")):
+            return True
+    # stores written before the manifest existed (or in another format) use an older row order
+    manifest = _read_manifest(store_dir)
+    if manifest is None or manifest.get("format_version") != CF_STORE_FORMAT:
+        return True
+    return os.path.exists(npz_path) and os.path.getmtime(npz_path) > os.path.getmtime(V_path)
+
+
+def load_cf_store(store_dir=CF_STORE_DIR, npz_path=CF_NPZ_PATH, games_path=GAMES_PATH):
+    """
+    Load the CF store memory-mapped, (re)building it first if missing, older
+    than the npz or of another store format.
+    """
+    if _store_is_stale(store_dir, npz_path):
+        build_cf_store(npz_path=npz_path, games_path=games_path, store_dir=store_dir)
+
+    V = np.load(os.path.join(store_dir, "V.npy"), mmap_mode="r")
+    V_quantized = QuantizedEmbeddings(
+        np.load(os.path.join(store_dir, "V_q.npy"), mmap_mode="r"),
+        np.load(os.path.join(store_dir, "V_row_scale.npy")),
+    )
+    bgg_ids = np.load(os.path.join(store_dir, "bgg_ids.npy"))
+    return CFModelStore(V, bgg_ids, V_quantized=V_quantized, manifest=_read_manifest(store_dir))
+
+
+_cf_store = None
+_cf_store_lock = threading.Lock()
+
+
+def get_cf_store():
+    """Process-wide CF store, loaded on first use."""
+    global _cf_store
+    if _cf_store is None:
+        with _cf_store_lock:
+            if _cf_store is None:
+                _cf_store = load_cf_store()
+    return _cf_store
+
+
 def fold_in_implicit_user(V, liked_items, alpha=5, lambda_=0.03):
     """
     Compute a new user vector given items they've liked (implicit feedback).
@@ -23,20 +215,196 @@ def fold_in_implicit_user(V, liked_items, alpha=5, lambda_=0.03):
     
     return u_new
 
+class FoldInState:
+    """
+    Incremental fold_in_implicit_user for one user whose likes change one at a time.
+
+    Keeps the inverse of A = V_i^T C V_i + lambda I and b = V_i^T C 1 for the
+    current liked rows. Adding or removing a liked item is a Sherman-Morrison
+    rank-one update of A^-1, so the new user vector costs O(k^2) instead of a
+    full re-solve. A^-1 is recomputed from scratch every refactor_every updates
+    to keep rounding error from accumulating.
+
+    All methods hold a per-state lock. A scorer thread that outlived its
+    timeout may still be updating the state when the session's next request
+    arrives, and that request then waits for it instead of racing it.
+    """
+
+    def __init__(self, V, alpha=5, lambda_=0.3, refactor_every=64):
+        self.V = V
+        self.c = 1 + alpha
+        self.lambda_ = lambda_
+        self.refactor_every = refactor_every
+        self.liked_rows = set()
+        self._lock = threading.RLock()
+        self.refactor()
+
+    def refactor(self):
+        with self._lock:
+            k = self.V.shape[1]
+            rows = np.array(sorted(self.liked_rows), dtype=int)
+            V_i = np.asarray(self.V[rows], dtype=np.float64).reshape(len(rows), k)
+            self.A_inv = np.linalg.inv(self.c * V_i.T @ V_i + self.lambda_ * np.eye(k))
+            self.b = self.c * V_i.sum(axis=0)
+            self._n_updates = 0
+
+    def _rank_one_update(self, row, sign):
+        v = np.asarray(self.V[row], dtype=np.float64)
+        A_inv_v = self.A_inv @ v
+        denom = 1 + sign * self.c * v @ A_inv_v
+        self.A_inv -= sign * self.c * np.outer(A_inv_v, A_inv_v) / denom
+        self.b += sign * self.c * v
+        self._n_updates += 1
+        if self._n_updates >= self.refactor_every:
+            self.refactor()
+
+    def add(self, row):
+        row = int(row)
+        with self._lock:
+            if row not in self.liked_rows:
+                self.liked_rows.add(row)
+                self._rank_one_update(row, +1)
+
+    def remove(self, row):
+        row = int(row)
+        with self._lock:
+            if row in self.liked_rows:
+                self.liked_rows.discard(row)
+                self._rank_one_update(row, -1)
+
+    def sync(self, liked_rows):
+        """Apply the adds/removes needed to make the state match liked_rows."""
+        liked_rows = {int(row) for row in liked_rows}
+        with self._lock:
+            for row in self.liked_rows - liked_rows:
+                self.remove(row)
+            for row in liked_rows - self.liked_rows:
+                self.add(row)
+
+    def fold_in(self, liked_rows):
+        """sync to liked_rows and return the user vector, as one atomic step."""
+        with self._lock:
+            self.sync(liked_rows)
+            return self.user_vector
+
+    @property
+    def user_vector(self):
+        with self._lock:
+            return self.A_inv @ self.b
+
+
+def create_fold_in_state(quantized=True, alpha=5, lambda_=0.3):
+    """FoldInState over the shared CF store, with the same weights get_cf_scores uses."""
+    store = get_cf_store()
+    return FoldInState(store.V_quantized if quantized else store.V, alpha=alpha, lambda_=lambda_)
+
+
+def fold_in_implicit_users(V, liked_items_list, alpha=5, lambda_=0.03, batch_size=512):
+    """
+    Batched version of fold_in_implicit_user for many users at once.
+
+    liked_items_list is a ragged list of arrays of liked item rows. Users are
+    processed in batches sorted by number of likes (to keep padding small); each
+    batch gathers a padded (batch, max_likes, k) block of V and solves all of its
+    systems in a single np.linalg.solve call. When users have fewer likes than
+    there are factors the equivalent max_likes x max_likes form is solved, which
+    is much cheaper than the k x k normal equations.
+
+    Returns a (n_users, k) float32 matrix of user vectors, in input order.
+    """
+    liked_items_list = [np.asarray(items, dtype=int).ravel() for items in liked_items_list]
+    n_users, k = len(liked_items_list), V.shape[1]
+    U = np.zeros((n_users, k), dtype=np.float32)
+    if n_users == 0:
+        return U
+
+    lengths = np.array([len(items) for items in liked_items_list])
+    order = np.argsort(lengths, kind="stable")
+    reg = lambda_ * np.eye(k, dtype=np.float32)
+
+    for start in range(0, n_users, batch_size):
+        users = order[start:start + batch_size]
+        batch_lengths = lengths[users]
+        max_len = max(batch_lengths.max(), 1)
+
+        # padded item rows, masked out beyond each user's number of likes
+        mask = np.arange(max_len) < batch_lengths[:, None]
+        padded = np.zeros((len(users), max_len), dtype=int)
+        if batch_lengths.sum() > 0:
+            padded[mask] = np.concatenate([liked_items_list[u] for u in users])
+        V_i = V[padded] * mask[..., None]
+
+        # confidence weights are constant per liked item, as in fold_in_implicit_user
+        c = 1 + alpha
+        if max_len < k:
+            # (lambda I + c V_i^T V_i)^-1 V_i^T = V_i^T (lambda I + c V_i V_i^T)^-1, so with
+            # fewer likes than factors solve the small (max_len x max_len) system instead;
+            # padded rows of V_i are zero and get a zero weight
+            G = c * (V_i @ V_i.transpose(0, 2, 1)) + lambda_ * np.eye(max_len, dtype=np.float32)
+            w = np.linalg.solve(G, c * mask[..., None].astype(np.float32))
+            U[users] = (V_i.transpose(0, 2, 1) @ w)[..., 0]
+        else:
+            A = c * (V_i.transpose(0, 2, 1) @ V_i) + reg
+            b = c * V_i.sum(axis=1)
+            U[users] = np.linalg.solve(A, b[..., None])[..., 0]
+
+    return U
+
+
+def iter_cf_score_blocks(U, V, block_size=256, normalize=True):
+    """
+    Yield (start, scores) where scores is the (block, n_items) slice of U @ V.T
+    for users start:start+block. With normalize each row is min-max scaled to
+    [0, 1] like get_cf_scores (constant rows become zeros).
+    """
+    for start in range(0, U.shape[0], block_size):
+        scores = np.asarray(V.dot(U[start:start + block_size].T)).T
+        if normalize:
+            lo = scores.min(axis=1, keepdims=True)
+            span = scores.max(axis=1, keepdims=True) - lo
+            scores = np.where(span > 0, (scores - lo) / np.where(span > 0, span, 1), 0)
+        yield start, scores
+
+
+def get_cf_user_vectors(liked_items_list, quantized=True, alpha=5, lambda_=0.3):
+    """Fold in many users given ragged lists of liked BGGIds, against the shared CF store."""
+    store = get_cf_store()
+    V = store.V_quantized if quantized else store.V
+    liked_rows = [store.rows_for(liked_items) for liked_items in liked_items_list]
+    return fold_in_implicit_users(V, liked_rows, alpha=alpha, lambda_=lambda_)
+
+
 def get_cf_scores(
     liked_items: np.ndarray = np.array([]),
     V = None,
-    games_path: str = "./data/games.csv",
+    games_path: str = None,
+    quantized: bool = True,
+    fold_in_state: FoldInState = None,
+    candidates: np.ndarray = None,
+    store: CFModelStore = None,
 ):
     """
     Compute CF-based recommendation scores based on pre-computed item embedding matrix V and a vector of movie IDs of user likes
 
     Parameters
     ----------
-    ratings : array
-        array of indices of liked items
+    liked_items : array
+        array of BGGIds of liked items
     V : matrix
-        item embedding matrix used to predict CF scores
+        item embedding matrix used to predict CF scores, defaults to the shared CF store
+    games_path : str
+        games.csv whose row order matches V, only needed when V is passed in
+    quantized : bool
+        score on the store's int8 embeddings (default) instead of float32 V
+    fold_in_state : FoldInState
+        per-session state that is synced to liked_items with rank-one updates
+        instead of re-solving the fold-in; its V is used for scoring
+    candidates : array
+        row indices of the games to score; when given, only these rows are
+        scored and normalized, all other games get 0
+    store : CFModelStore
+        store to score against instead of the shared one; its V or V_quantized
+        is used according to quantized
 
     Returns
     -------
@@ -44,32 +412,87 @@ def get_cf_scores(
         array of ratings for each board game
     """
 
-    #load board game embeddings if it wasn't passed in
-    if V is None:
-        data = np.load('./data/V_final_quantized.npz')
-        V = data["V_q"].astype(np.float32) / 127 * data["scale"]
-
-    games_df = pd.read_csv(games_path)['BGGId']
+    #use the shared board game embeddings if they weren't passed in
+    if fold_in_state is not None:
+        store = store or get_cf_store()
+        V = fold_in_state.V
+    elif V is None:
+        store = store or get_cf_store()
+        V = store.V_quantized if quantized else store.V
+    else:
+        store = CFModelStore(V, pd.read_csv(games_path or GAMES_PATH, usecols=["BGGId"])["BGGId"])
 
     #get the index number of the liked games
-    liked_index = games_df.isin(liked_items).index
+    liked_index = store.rows_for(liked_items)
+    if fold_in_state is not None:
+        u = fold_in_state.fold_in(liked_index)
+    if len(liked_index) == 0:
+        return np.zeros(V.shape[0])
 
     # calculte user embeddings based on inputted likes 
-    u = fold_in_implicit_user(V,liked_items=liked_index, alpha=5, lambda_=0.3)
+    if fold_in_state is None:
+        u = fold_in_implicit_user(V,liked_items=liked_index, alpha=5, lambda_=0.3)
 
     #calculate scores
-    scores = V.dot(u)
+    if candidates is None:
+        scores = V.dot(u)
+    else:
+        candidates = np.asarray(candidates, dtype=np.int64)
+        if len(candidates) == 0:
+            return np.zeros(V.shape[0])
+        scores = np.asarray(V[candidates]) @ u
+
+    #normalize between 0 and 1, a constant candidate set (e.g. a single game) all ranks first
+    if scores.max() > scores.min():
+        scores = (scores - scores.min()) / (scores.max() - scores.min())
+    elif candidates is not None:
+        scores = np.ones_like(scores)
+    else:
+        scores = np.zeros_like(scores)
 
-    #normalize between 0 and 1 
-    scores = (scores - min(scores)) / (max(scores) - min(scores))
+    if candidates is not None:
+        full_scores = np.zeros(V.shape[0], dtype=scores.dtype)
+        full_scores[candidates] = scores
+        scores = full_scores
 
     # returns array of scores per movie
     return scores
 
+def quantization_report(n_users=200, n_liked=5, top_k=10, seed=0, store=None):
+    """
+    Compare int8 scoring against the float32 path for random simulated users.
+
+    Returns a dict with the memory footprint of both representations, the
+    absolute error of the normalized scores and the mean overlap of the top_k lists.
+    """
+    store = store or get_cf_store()
+    rng = np.random.default_rng(seed)
+
+    abs_errors = []
+    overlaps = []
+    for _ in range(n_users):
+        liked = store.bgg_ids[rng.choice(store.n_items, size=n_liked, replace=False)]
+        exact = get_cf_scores(liked, quantized=False, store=store)
+        approx = get_cf_scores(liked, quantized=True, store=store)
+        abs_errors.append(np.abs(exact - approx))
+        top_exact = np.argpartition(-exact, top_k)[:top_k]
+        top_approx = np.argpartition(-approx, top_k)[:top_k]
+        overlaps.append(len(np.intersect1d(top_exact, top_approx)) / top_k)
+
+    abs_errors = np.concatenate(abs_errors)
+    return {
+        "float32_mb": store.n_items * store.V.shape[1] * 4 / 1e6,
+        "int8_mb": store.V_quantized.nbytes / 1e6,
+        "max_abs_error": float(abs_errors.max()),
+        "mean_abs_error": float(abs_errors.mean()),
+        f"top{top_k}_overlap": float(np.mean(overlaps)),
+    }
+
 if __name__ == "__main__":
     # Example usage
     example_ratings = np.array([10, 50, 200, 33333])
     scores = get_cf_scores(liked_items=example_ratings)
     print("CF Scores:", scores)
     print("CF Scores Length:", len(scores))
+    print("Quantization report:", quantization_report())
     
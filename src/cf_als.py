@@ -0,0 +1,294 @@
+"""
+cf_als.py
+Implicit-feedback ALS training for the CF item embeddings used by cf.py.
+
+Follows the pipeline of notebooks/cf.ipynb (users with >= 5 ratings, BM25
+weighting, build_confidence_matrix, implicit ALS) but solves each half-step
+with a few conjugate-gradient iterations vectorized over blocks of rows, and
+runs the blocks on a thread pool so all cores are used.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix
+
+from id_index import IdIndex
+
+RATINGS_PATH = "./data/user_ratings.csv"
+
+
+def load_ratings_matrix(ratings_path=RATINGS_PATH, item_ids=None, min_user_ratings=5, chunksize=1_000_000):
+    """
+    Stream user_ratings.csv (Username, BGGId, Rating) into a users x items CSR matrix.
+
+    Columns follow item_ids when given (e.g. the games.csv order cf.py expects;
+    ratings of other games are dropped), otherwise the sorted unique BGGIds.
+    Users with fewer than min_user_ratings ratings are dropped.
+
+    Returns (R, usernames, item_ids).
+    """
+    user_codes = {}
+    users, items, ratings = [], [], []
+    for chunk in pd.read_csv(ratings_path, usecols=["Username", "BGGId", "Rating"], chunksize=chunksize):
+        codes, uniques = pd.factorize(chunk["Username"])
+        global_codes = np.array([user_codes.setdefault(u, len(user_codes)) for u in uniques], dtype=np.int64)
+        users.append(global_codes[codes])
+        items.append(chunk["BGGId"].to_numpy(dtype=np.int64))
+        ratings.append(chunk["Rating"].to_numpy(dtype=np.float32))
+
+    users = np.concatenate(users)
+    items = np.concatenate(items)
+    ratings = np.concatenate(ratings)
+
+    if item_ids is None:
+        item_ids = np.unique(items)
+    item_ids = np.asarray(item_ids, dtype=np.int64)
+    cols = IdIndex(item_ids).lookup(items)
+    keep = cols >= 0
+
+    # only keep users with enough ratings, re-numbered in sorted username order
+    usernames = np.array(list(user_codes), dtype=object)
+    counts = np.bincount(users[keep], minlength=len(usernames))
+    kept_users = np.flatnonzero(counts >= min_user_ratings)
+    kept_users = kept_users[np.argsort(usernames[kept_users].astype(str), kind="stable")]
+    user_rows = np.full(len(usernames), -1, dtype=np.int64)
+    user_rows[kept_users] = np.arange(len(kept_users))
+    rows = user_rows[users]
+    keep &= rows >= 0
+
+    R = coo_matrix(
+        (ratings[keep], (rows[keep], cols[keep])),
+        shape=(len(kept_users), len(item_ids)),
+    ).tocsr()
+    return R, usernames[kept_users], item_ids
+
+
+def bm25_stats(X):
+    """Corpus statistics bm25_weight derives from X: user count, per-item rating counts, mean row sum."""
+    X = coo_matrix(X, dtype=np.float32)
+    return {
+        "bm25_n_users": np.int64(X.shape[0]),
+        "bm25_item_counts": np.bincount(X.col, minlength=X.shape[1]).astype(np.int64),
+        "bm25_mean_row_sum": np.float64(X.sum() / max(X.shape[0], 1)),
+    }
+
+
+def bm25_weight(X, K1=1.2, B=0.75, stats=None):
+    """
+    BM25 re-weighting of a users x items matrix (same formula as implicit.nearest_neighbours.bm25_weight).
+
+    The idf and length normalization come from stats (see bm25_stats) when given,
+    so a batch of new ratings is weighted like the training matrix was.
+    """
+    X = coo_matrix(X, dtype=np.float32)
+    stats = stats or bm25_stats(X)
+    N = float(stats["bm25_n_users"])
+    idf = np.log(N) - np.log1p(stats["bm25_item_counts"])
+    row_sums = np.ravel(X.sum(axis=1))
+    length_norm = (1.0 - B) + B * row_sums / stats["bm25_mean_row_sum"]
+    X.data = X.data * (K1 + 1.0) / (K1 * length_norm[X.row] + X.data) * idf[X.col]
+    return X.tocsr()
+
+
+def build_confidence_matrix(R, alpha = 20, r_min = 1, r_max = 10, gamma = 1.0):
+    R_scaled = R.copy().astype(np.float32)
+    R_scaled.data = np.clip((R_scaled.data - r_min) / (r_max - r_min), 0, 1)
+    if gamma != 1.0:
+        R_scaled.data = R_scaled.data ** gamma
+
+    C = R_scaled.tocsr()
+    C.data = 1 + alpha * C.data
+    return C
+
+
+def _row_blocks(indptr, max_nnz):
+    """Split CSR rows into contiguous blocks of at most ~max_nnz non-zeros."""
+    n_rows = len(indptr) - 1
+    starts = [0]
+    boundary = max_nnz
+    while starts[-1] < n_rows:
+        stop = int(np.searchsorted(indptr, boundary, side="right")) - 1
+        stop = min(max(stop, starts[-1] + 1), n_rows)
+        starts.append(stop)
+        boundary = indptr[stop] + max_nnz
+    return list(zip(starts[:-1], starts[1:]))
+
+
+def _cg_block(C, X, Y, YtY, lambda_, cg_steps, b_extra=None):
+    """
+    Conjugate-gradient update of the rows of X (one block of a half-step) for
+
+        (Y^T Y + Y^T (C_u - I) Y + lambda I) x_u = Y^T C_u p_u (+ b_extra_u)
+
+    with preference p_u = 1 on the observed entries, warm-started from X.
+    """
+    n_rows = C.shape[0]
+    row_of_nnz = np.repeat(np.arange(n_rows), np.diff(C.indptr))
+    Y_nnz = Y[C.indices]
+    conf_minus_one = C.data - 1
+
+    def matvec(P):
+        d = np.einsum("ij,ij->i", Y_nnz, P[row_of_nnz]) * conf_minus_one
+        W = csr_matrix((d, C.indices, C.indptr), shape=C.shape)
+        return P @ YtY + lambda_ * P + W @ Y
+
+    b = C @ Y
+    if b_extra is not None:
+        b += b_extra
+    r = b - matvec(X)
+    p = r.copy()
+    rs_old = np.einsum("ij,ij->i", r, r)
+    for _ in range(cg_steps):
+        Ap = matvec(p)
+        pAp = np.einsum("ij,ij->i", p, Ap)
+        step = np.divide(rs_old, pAp, out=np.zeros_like(rs_old), where=pAp > 0)
+        X += step[:, None] * p
+        r -= step[:, None] * Ap
+        rs_new = np.einsum("ij,ij->i", r, r)
+        beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+        p = r + beta[:, None] * p
+        rs_old = rs_new
+    return X
+
+
+def als_half_step(C, X, Y, lambda_, cg_steps=3, executor=None, max_block_nnz=100_000):
+    """Update every row of X given fixed Y; blocks of rows run in parallel on executor."""
+    C = C.tocsr()
+    YtY = Y.T @ Y
+
+    def update(block):
+        start, stop = block
+        X[start:stop] = _cg_block(C[start:stop], X[start:stop], Y, YtY, lambda_, cg_steps)
+
+    blocks = _row_blocks(C.indptr, max_block_nnz)
+    if executor is None:
+        for block in blocks:
+            update(block)
+    else:
+        list(executor.map(update, blocks))
+    return X
+
+
+def train_implicit_als(C, factors=256, regularization=0.03, iterations=25, cg_steps=3,
+                       n_workers=None, seed=42, verbose=True):
+    """
+    Implicit ALS on a users x items confidence matrix C.
+
+    Returns (U, V, iteration_seconds); U is users x factors, V items x factors.
+    """
+    rng = np.random.default_rng(seed)
+    Cui = C.tocsr().astype(np.float32)
+    Ciu = Cui.T.tocsr()
+    U = (rng.standard_normal((Cui.shape[0], factors)) * 0.01).astype(np.float32)
+    V = (rng.standard_normal((Cui.shape[1], factors)) * 0.01).astype(np.float32)
+
+    timings = []
+    with ThreadPoolExecutor(max_workers=n_workers or os.cpu_count()) as executor:
+        for iteration in range(iterations):
+            t0 = time.perf_counter()
+            als_half_step(Cui, U, V, regularization, cg_steps=cg_steps, executor=executor)
+            als_half_step(Ciu, V, U, regularization, cg_steps=cg_steps, executor=executor)
+            timings.append(time.perf_counter() - t0)
+            if verbose:
+                print(f"iteration {iteration + 1}/{iterations}: {timings[-1]:.2f}s")
+    return U, V, timings
+
+
+def training_stats(R, U):
+    """
+    What incremental_update needs from a full training run on ratings R with
+    user factors U: the BM25 statistics of R and the Gram matrix U^T U.
+    """
+    return {**bm25_stats(R), "user_gram": (U.T @ U).astype(np.float32)}
+
+
+def incremental_update(V, R_delta, regularization=0.03, alpha=160, gamma=3.0, anchor=10.0,
+                       n_steps=2, cg_steps=10, train_stats=None):
+    """
+    Refresh V from a batch of new ratings without retraining on the full history.
+
+    R_delta is a users x items matrix of the new ratings only (columns in V's row
+    order). Each step folds the affected users in against the current V, then
+    re-solves only the touched items against those users. The full-history term
+    of the item solve is out of reach, so it is replaced by a quadratic prior
+    around each item's previous vector:
+
+        (U_d^T C_j U_d + G + lambda I) v_j = U_d^T C_j 1 + (G + lambda I) v_j_old
+
+    With train_stats (see training_stats) G is the training users' Gram matrix
+    U^T U, the bulk of the full-history item Hessian, and R_delta is BM25-weighted
+    with the training statistics before build_confidence_matrix, as in training;
+    alpha and gamma then mean what they meant there. Without them (models saved
+    before the statistics were) the delta is used unweighted and G = anchor I.
+    Users are folded in from their rows of R_delta alone, without their earlier
+    ratings.
+
+    Returns (V_new, touched_items, U_delta).
+    """
+    V_new = np.array(V, dtype=np.float32)
+    k = V_new.shape[1]
+    if train_stats is not None:
+        R_delta = bm25_weight(R_delta, stats=train_stats)
+        prior = train_stats["user_gram"].astype(np.float32)
+    else:
+        prior = anchor * np.eye(k, dtype=np.float32)
+    C = build_confidence_matrix(R_delta, alpha=alpha, gamma=gamma).tocsr()
+    touched_items = np.unique(C.indices)
+    C_items = C[:, touched_items].T.tocsr()
+
+    U_delta = np.zeros((C.shape[0], k), dtype=np.float32)
+    V_old = V_new[touched_items].copy()
+    b_prior = V_old @ (prior + regularization * np.eye(k, dtype=np.float32))
+    for _ in range(n_steps):
+        als_half_step(C, U_delta, V_new, regularization, cg_steps=cg_steps)
+        V_touched = V_new[touched_items]
+        V_new[touched_items] = _cg_block(
+            C_items, V_touched, U_delta, U_delta.T @ U_delta + prior,
+            regularization, cg_steps, b_extra=b_prior,
+        )
+    return V_new, touched_items, U_delta
+
+
+def save_quantized(V, path, version=None, train_stats=None):
+    """
+    Write V in the V_final_quantized.npz format cf.py reads (V ~= V_q / 127 * scale),
+    plus the training statistics incremental_update uses, if given.
+    """
+    scale = np.float32(np.abs(V).max())
+    V_q = np.rint(V / scale * 127).astype(np.int8)
+    extra = {} if version is None else {"version": np.int64(version)}
+    np.savez_compressed(path, V_q=V_q, scale=scale, **extra, **(train_stats or {}))
+
+
+def load_quantized(path):
+    """Read a V_final_quantized.npz; returns (V, version), version 0 if the file has none."""
+    data = np.load(path)
+    V = data["V_q"].astype(np.float32) / 127 * data["scale"]
+    version = int(data["version"]) if "version" in data.files else 0
+    return V, version
+
+
+def load_train_stats(path):
+    """Training statistics saved with a V_final_quantized.npz, or None if it has none."""
+    data = np.load(path)
+    keys = ["bm25_n_users", "bm25_item_counts", "bm25_mean_row_sum", "user_gram"]
+    if not all(key in data.files for key in keys):
+        return None
+    return {key: data[key] for key in keys}
+
+
+def latest_version_path(versions_dir):
+    """Path of the highest V_final_quantized_v<N>.npz in versions_dir, or None if there is none."""
+    if not os.path.isdir(versions_dir):
+        return None
+    versions = [
+        (int(match.group(1)), name)
+        for name in os.listdir(versions_dir)
+        if (match := re.fullmatch(r"V_final_quantized_v(\d+)\.npz", name))
+    ]
+    return os.path.join(versions_dir, max(versions)[1]) if versions else None
@@ -0,0 +1,59 @@
+"""
+component_store.py
+Per-session store of the CF, CBF and LLM score vectors of recent requests.
+
+Each component vector depends only on part of a request: CF on the liked
+games, CBF on the attributes it encodes, the LLM on the description. When a
+user only moves a filter slider or switches blend weights, ensemble_scores
+finds the unchanged components here and just re-applies the mask and
+re-blends them; only components whose inputs changed are recomputed.
+
+The LLM only scores a pool of candidates, so its vector is stored with the
+rows it was asked about and reused only for requests whose own pool is a
+subset of them: a filter change that admits games the LLM never saw costs
+another OpenAI call.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+COMPONENTS = ("cf", "cbf", "llm")
+
+
+class ComponentStore:
+    """Last few score vectors of each component, keyed by that component's inputs."""
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {component: OrderedDict() for component in COMPONENTS}
+
+    def get(self, component, key, rows=None):
+        """
+        Stored scores of component for key, or None. With rows, an entry stored
+        with scored_rows only counts if it scored every one of rows.
+        """
+        entries = self._entries[component]
+        entry = entries.get(key)
+        if entry is None or (rows is not None and entry[1] is not None and not np.isin(rows, entry[1]).all()):
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, component, key, scores, scored_rows=None):
+        """Store scores for key; scored_rows are the rows the scorer was asked about, if not all."""
+        scores = np.asarray(scores)
+        scores.setflags(write=False)
+        entries = self._entries[component]
+        entries[key] = (scores, None if scored_rows is None else np.asarray(scored_rows))
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def clear(self):
+        for entries in self._entries.values():
+            entries.clear()
@@ -0,0 +1,51 @@
+"""
+Shared pytest fixtures.
+
+Most tests build small synthetic artifacts in tmp_path. Tests that need the
+real data (./data relative to the working directory, plus the Streamlit
+secrets for the LLM module) are skipped when it is not available, e.g. in a
+checkout where the data files are still git-lfs pointers.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+
+def real_data_available():
+    """True if ./data holds the real catalog, CF model and CBF bundle (not git-lfs pointers)."""
+    required = [
+        "data/games_master_data.csv",
+        "data/games.csv",
+        "data/V_final_quantized.npz",
+        "data/game_descriptions.csv",
+        "data/precomputed_CBF/manifest.json",
+        ".streamlit/secrets.toml",
+    ]
+    for path in required:
+        if not os.path.exists(path):
+            return False
+    with open("data/games_master_data.csv", "rb") as f:
+        return not f.read(64).startswith(b"version https://git-lfs")
+
+
+requires_data = pytest.mark.skipif(not real_data_available(), reason="needs the real ./data artifacts")
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def write_cf_model(directory, n_items=300, k=16, seed=0):
+    """Write a V_final_quantized.npz and a games.csv (unsorted BGGIds) into directory; returns (V, bgg_ids)."""
+    rng = np.random.default_rng(seed)
+    V = rng.standard_normal((n_items, k)).astype(np.float32)
+    scale = np.float32(np.abs(V).max())
+    V_q = np.rint(V / scale * 127).astype(np.int8)
+    np.savez(os.path.join(directory, "V_final_quantized.npz"), V_q=V_q, scale=scale)
+    bgg_ids = rng.permutation(np.arange(1, 10 * n_items, 10))[:n_items]
+    with open(os.path.join(directory, "games.csv"), "w") as f:
+        f.write("BGGId,Name\n" + "".join(f"{gid},Game {gid}\n" for gid in bgg_ids))
+    return V_q.astype(np.float32) / 127 * scale, bgg_ids
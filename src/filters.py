@@ -0,0 +1,93 @@
+"""
+filters.py
+Attribute filters shared by the ensemble and the LLM candidate pool.
+
+A FilterEngine holds the filterable columns of a games table as NumPy arrays
+plus the label bitsets of the multi-label columns, and turns an attributes
+dict into a single boolean row mask. The ensemble computes the mask once per
+request and hands it to the scorers, so every model sees the same candidates.
+
+Semantics (those of the original ensemble filters):
+    game_categories / game_mechanics / game_types
+                        any of the selected labels, stripped and case-insensitive;
+                        ignored when no non-blank label is selected
+    game_weight, year_published
+                        [min, max] inclusive
+    players, play_time  [min, max] overlaps the game's [*_min, *_max] range
+    min_rating          [value], avg_rating >= value
+Range filters apply only when given as a two-element list or tuple; missing
+values never pass a filter that applies to them.
+"""
+
+import numpy as np
+
+from label_index import build_label_indexes
+
+LABEL_COLUMNS = ["game_categories", "game_mechanics", "game_types"]
+NUMERIC_COLUMNS = ["game_weight", "year_published", "avg_rating", "players_min", "players_max", "time_min", "time_max"]
+
+# attribute -> (min column, max column) of the game's range
+BETWEEN_FILTERS = {
+    "game_weight": ("game_weight", "game_weight"),
+    "year_published": ("year_published", "year_published"),
+    "players": ("players_min", "players_max"),
+    "play_time": ("time_min", "time_max"),
+}
+
+
+def _is_range(value):
+    return isinstance(value, (list, tuple)) and len(value) == 2
+
+
+# compare float columns at their own precision, so float32 storage keeps the float64 results
+def _bound(value, column):
+    return column.dtype.type(value) if np.issubdtype(column.dtype, np.floating) else value
+
+
+class FilterEngine:
+    """Columnar attribute filters over the rows of one games table."""
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.label_indexes = build_label_indexes(df, LABEL_COLUMNS)
+        self.columns = {
+            column: df[column].to_numpy(dtype=np.float64)
+            for column in NUMERIC_COLUMNS if column in df.columns
+        }
+
+    @classmethod
+    def from_columns(cls, n_rows, columns, label_indexes):
+        """Engine over columns already held as arrays (e.g. the compact catalog's) and prebuilt label indexes."""
+        engine = cls.__new__(cls)
+        engine.n_rows = n_rows
+        engine.label_indexes = label_indexes
+        engine.columns = {column: columns[column] for column in NUMERIC_COLUMNS if column in columns}
+        return engine
+
+    def mask(self, attributes):
+        """Boolean mask of the rows passing every filter in attributes."""
+        mask = np.ones(self.n_rows, dtype=bool)
+        if not attributes:
+            return mask
+
+        for column in LABEL_COLUMNS:
+            selected = attributes.get(column) or []
+            if column in self.label_indexes and any(isinstance(s, str) and s.strip() for s in selected):
+                mask &= self.label_indexes[column].any_of(selected)
+
+        for attr_name, (min_column, max_column) in BETWEEN_FILTERS.items():
+            value_range = attributes.get(attr_name)
+            if _is_range(value_range) and min_column in self.columns and max_column in self.columns:
+                lo, hi = value_range
+                max_values, min_values = self.columns[max_column], self.columns[min_column]
+                mask &= (max_values >= _bound(lo, max_values)) & (min_values <= _bound(hi, min_values))
+
+        min_rating = attributes.get("min_rating")
+        if isinstance(min_rating, (list, tuple)) and len(min_rating) > 0 and "avg_rating" in self.columns:
+            mask &= self.columns["avg_rating"] >= _bound(min_rating[0], self.columns["avg_rating"])
+
+        return mask
+
+    def candidates(self, attributes):
+        """Row indices passing every filter in attributes."""
+        return np.flatnonzero(self.mask(attributes))
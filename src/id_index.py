@@ -0,0 +1,65 @@
+"""
+id_index.py
+BGGId -> row mapping shared by the catalog and the model artifacts.
+
+The ids are held as int32 and looked up with np.searchsorted, so mapping k ids
+to rows costs O(k log n) with no per-id Python work. Artifacts whose rows are
+meant to line up with the catalog are checked with check_aligned when they
+are loaded, so a mismatched build fails immediately instead of silently
+scoring the wrong games.
+"""
+
+import numpy as np
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class IdIndex:
+    """Row lookup for a unique array of BGGIds (row i holds ids[i])."""
+
+    def __init__(self, ids):
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        if len(ids) and (ids.min() < 0 or ids.max() > INT32_MAX):
+            raise ValueError("BGGIds must fit in int32")
+
+        # sorted ids need no permutation, which is the catalog's (canonical) case
+        self.is_sorted = bool(np.all(ids[1:] > ids[:-1]))
+        self._order = None if self.is_sorted else np.argsort(ids, kind="stable")
+        self._sorted_ids = (ids if self.is_sorted else ids[self._order]).astype(np.int32)
+        if not self.is_sorted and np.any(self._sorted_ids[1:] == self._sorted_ids[:-1]):
+            raise ValueError("BGGIds must be unique")
+        self.ids = ids.astype(np.int32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, bgg_ids):
+        """Row of each BGGId, -1 for ids not in the index."""
+        bgg_ids = np.asarray(bgg_ids if bgg_ids is not None else [], dtype=np.int64).ravel()
+        if len(self.ids) == 0:
+            return np.full(len(bgg_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_ids, bgg_ids), len(self.ids) - 1)
+        found = self._sorted_ids[positions] == bgg_ids
+        rows = positions if self._order is None else self._order[positions]
+        return np.where(found, rows, -1)
+
+    def rows_for(self, bgg_ids):
+        """Rows of the given BGGIds, unknown ids dropped."""
+        rows = self.lookup(bgg_ids)
+        return rows[rows >= 0]
+
+    def contains(self, bgg_ids):
+        return self.lookup(bgg_ids) >= 0
+
+    def check_aligned(self, name, artifact_ids):
+        """Raise ValueError unless artifact_ids lists exactly these ids in the same row order."""
+        artifact_ids = np.asarray(artifact_ids, dtype=np.int64).ravel()
+        if len(artifact_ids) != len(self.ids):
+            raise ValueError(f"{name} has {len(artifact_ids)} rows but the catalog has {len(self.ids)} games")
+        mismatched = np.flatnonzero(artifact_ids != self.ids)
+        if len(mismatched):
+            row = mismatched[0]
+            raise ValueError(
+                f"{name} rows are not in catalog order: {len(mismatched)} rows differ, "
+                f"first at row {row} (BGGId {artifact_ids[row]}, catalog has {self.ids[row]}); rebuild it"
+            )
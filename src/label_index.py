@@ -0,0 +1,75 @@
+"""
+label_index.py
+Inverted index over a multi-label game column (categories, mechanics, types).
+
+Each label owns a packed bitset of the rows that carry it, built once at load
+time, so an "any of the selected labels" filter is a bitwise OR of a few
+bitsets instead of a Python loop over every game's label list.
+"""
+
+import numpy as np
+
+
+def normalize_label(label):
+    return label.strip().lower()
+
+
+class LabelIndex:
+    """Packed per-label row bitsets of one multi-label column."""
+
+    def __init__(self, values):
+        """
+        values - one entry per row: a list of labels, a single label string,
+                 or anything else (treated as no labels)
+        """
+        self.label_ids = {}
+        rows, ids = [], []
+        for row, labels in enumerate(values):
+            if isinstance(labels, str):
+                labels = [labels]
+            elif not isinstance(labels, (list, tuple)):
+                continue
+            for label in labels:
+                if isinstance(label, str) and label.strip():
+                    rows.append(row)
+                    ids.append(self.label_ids.setdefault(normalize_label(label), len(self.label_ids)))
+
+        self.n_rows = len(values)
+        bits = np.zeros((len(self.label_ids), self.n_rows), dtype=bool)
+        bits[ids, rows] = True
+        self.bitsets = np.packbits(bits, axis=1)
+
+    @classmethod
+    def from_csr(cls, offsets, indices, vocabulary):
+        """
+        Index of a column stored as CSR arrays: the labels of row i are
+        vocabulary[indices[offsets[i]:offsets[i + 1]]].
+        """
+        index = cls([])
+        label_ids = [index.label_ids.setdefault(normalize_label(label), len(index.label_ids)) for label in vocabulary]
+        index.n_rows = len(offsets) - 1
+        rows = np.repeat(np.arange(index.n_rows), np.diff(offsets))
+        bits = np.zeros((len(index.label_ids), index.n_rows), dtype=bool)
+        bits[np.asarray(label_ids, dtype=np.int64)[indices], rows] = True
+        index.bitsets = np.packbits(bits, axis=1)
+        return index
+
+    def any_of(self, selected):
+        """
+        Boolean row mask of rows carrying at least one of the selected labels
+        (compared stripped and lower-cased). Labels not in the index match nothing.
+        """
+        ids = [
+            self.label_ids[normalize_label(s)]
+            for s in selected
+            if isinstance(s, str) and s.strip() and normalize_label(s) in self.label_ids
+        ]
+        if not ids:
+            return np.zeros(self.n_rows, dtype=bool)
+        combined = np.bitwise_or.reduce(self.bitsets[ids], axis=0)
+        return np.unpackbits(combined, count=self.n_rows).astype(bool)
+
+
+def build_label_indexes(df, columns=("game_categories", "game_mechanics", "game_types")):
+    """LabelIndex for each of the given columns present in df."""
+    return {column: LabelIndex(df[column].tolist()) for column in columns if column in df.columns}
@@ -6,183 +6,78 @@ import pandas as pd
 from openai import OpenAI
 import streamlit as st
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+from catalog import get_catalog
 
+client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 
-def semicolon_to_list(value: Any) -> list:
-    """Normalize semicolon-delimited strings (or lists) into clean lists."""
-    if value is None or (isinstance(value, float) and pd.isna(value)):
-        return []
-    if isinstance(value, list):
-        return [item.strip() for item in value if isinstance(item, str) and item.strip()]
-    if isinstance(value, str):
-        return [item.strip() for item in value.split(";") if item.strip()]
-    return []
 
 # Load game data
-games_df = pd.read_csv("./data/games_master_data.csv", encoding="utf-8-sig")
-
-for col in [
-    "game_categories",
-    "simple_game_categories",
-    "game_mechanics",
-    "simple_game_mechanics",
-    "game_types",
-]:
-    if col in games_df.columns:
-        games_df[col] = games_df[col].apply(semicolon_to_list)
+catalog = get_catalog()
+games_df = catalog.games_df
 
-if "game_categories" in games_df.columns and "simple_game_categories" in games_df.columns:
-    games_df.drop(columns=["game_categories"], inplace=True)
-if "game_mechanics" in games_df.columns and "simple_game_mechanics" in games_df.columns:
-    games_df.drop(columns=["game_mechanics"], inplace=True)
-
-games_df.rename(
-    columns={
-        "simple_game_categories": "game_categories",
-        "simple_game_mechanics": "game_mechanics",
-    },
-    inplace=True,
-)
-
-desc_df = pd.read_csv("./data/game_descriptions.csv", encoding="utf-8-sig").rename(
-    columns={"bgg_id": "bgg_id", "full_description": "Description"}
-)
+# only the ids of game_descriptions.csv are needed: candidates without one are skipped
+desc_df = pd.read_csv("./data/game_descriptions.csv", usecols=["bgg_id"], encoding="utf-8-sig")
 
 # Merge datasets on bgg_id
 merged_df = pd.merge(
-    games_df.drop(columns=["Description"], errors="ignore"),
-    desc_df[["bgg_id", "Description"]],
+    games_df.reset_index(drop=True),
+    desc_df[["bgg_id"]],
     on="bgg_id",
     how="inner"
 )
 
-# Extract all category columns automatically
-category_source = games_df["game_categories"] if "game_categories" in games_df.columns else []
-all_categories = sorted(
-    {
-        cat.strip()
-        for cats in category_source
-        for cat in (cats if isinstance(cats, list) else [])
-        if isinstance(cat, str) and cat.strip()
-    }
-)
+# All category labels, from the catalog's label dictionary
+category_source = catalog.labels["game_categories"].vocabulary if "game_categories" in catalog.labels else []
+all_categories = sorted({cat.strip() for cat in category_source if isinstance(cat, str) and cat.strip()})
 category_columns = all_categories
 
+# columnar attribute filters over games_df rows, and the games_df row of each merged_df game
+filter_engine = catalog.filter_engine
+merged_rows = catalog.id_index.lookup(merged_df["bgg_id"].to_numpy())
 
-def apply_attribute_filters(df: pd.DataFrame, attributes: Optional[Dict[str, Any]]) -> pd.DataFrame:
-    """Apply the same attribute masks used by the ensemble to the LLM candidate pool."""
-    if not attributes:
-        return df
-
-    mask = pd.Series(True, index=df.index)
-
-    def multi_label_mask(column: str):
-        selected = attributes.get(column, [])
-        if column not in df.columns or not selected:
-            return None
-        selected_clean = {
-            s.strip().lower() for s in selected if isinstance(s, str) and s.strip()
-        }
-        if not selected_clean:
-            return None
-
-        def matches(values):
-            if isinstance(values, (list, tuple)):
-                return any(
-                    isinstance(v, str) and v.strip().lower() in selected_clean
-                    for v in values
-                )
-            if isinstance(values, str):
-                return values.strip().lower() in selected_clean
-            return False
 
-        return df[column].apply(matches).fillna(False)
+def _candidate_games(candidate_mask, top_k):
+    # the top_k best-rated candidates with a description; ties keep merged_df order,
+    # so every filter ranks the games it admits the same way
+    filtered_df = merged_df[np.asarray(candidate_mask, dtype=bool)[merged_rows]]
+    return filtered_df.sort_values("avg_rating", ascending=False, kind="stable").head(top_k)
 
-    for attr_column in ["game_categories", "game_mechanics", "game_types"]:
-        column_mask = multi_label_mask(attr_column)
-        if column_mask is not None:
-            mask &= column_mask
-
-    def range_mask(column: str, value_range):
-        if column not in df.columns:
-            return None
-        if (
-            isinstance(value_range, (list, tuple))
-            and len(value_range) == 2
-            and any(value_range)
-        ):
-            min_val, max_val = value_range
-            series = df[column]
-            return series.between(min_val, max_val, inclusive="both").fillna(False)
-        return None
-
-    weight_mask = range_mask("game_weight", attributes.get("game_weight"))
-    if weight_mask is not None:
-        mask &= weight_mask
-
-    year_mask = range_mask("year_published", attributes.get("year_published"))
-    if year_mask is not None:
-        mask &= year_mask
-
-    rating_values = attributes.get("min_rating")
-    if (
-        "avg_rating" in df.columns
-        and isinstance(rating_values, (list, tuple))
-        and rating_values
-    ):
-        min_rating = rating_values[0]
-        rating_mask = (df["avg_rating"] >= min_rating).fillna(False)
-        mask &= rating_mask
-
-    players_range = attributes.get("players")
-    if (
-        isinstance(players_range, (list, tuple))
-        and len(players_range) == 2
-        and "players_min" in df.columns
-        and "players_max" in df.columns
-    ):
-        p_min, p_max = players_range
-        players_mask = (df["players_max"] >= p_min) & (df["players_min"] <= p_max)
-        mask &= players_mask.fillna(False)
-
-    play_time_range = attributes.get("play_time")
-    if (
-        isinstance(play_time_range, (list, tuple))
-        and len(play_time_range) == 2
-        and play_time_range
-        and "time_min" in df.columns
-        and "time_max" in df.columns
-    ):
-        t_min, t_max = play_time_range
-        time_mask = (df["time_max"] >= t_min) & (df["time_min"] <= t_max)
-        mask &= time_mask.fillna(False)
-
-    return df[mask]
+def llm_candidate_rows(candidate_mask: np.ndarray, top_k: int = 200) -> np.ndarray:
+    """games_df rows of the games get_llm_scores puts in its prompt for candidate_mask."""
+    return catalog.id_index.lookup(_candidate_games(candidate_mask, top_k)["bgg_id"].to_numpy())
 
 def get_llm_scores(
     user_description: str,
     attributes: Optional[Dict[str, Any]] = None,
     top_k: int = 200,
+    candidate_mask: Optional[np.ndarray] = None,
+    timeout: Optional[float] = None,
 ):
     """
     Generate LLM-based relevance scores for candidate games based on the user description.
     The candidate pool is filtered with the same attribute masks used downstream so that
     the LLM signal survives the final ensemble filtering.
+
+    candidate_mask is the boolean mask over games_df rows already computed by the
+    caller's FilterEngine; when omitted it is computed here from attributes.
+    timeout (seconds) bounds the OpenAI request; None keeps the client default.
     """
     attributes = attributes or {}
-    filtered_df = apply_attribute_filters(merged_df, attributes)
-
-    if filtered_df.empty:
-        return np.zeros(len(games_df))
-
+    if candidate_mask is None:
+        candidate_mask = filter_engine.mask(attributes)
     # Limit to top games by rating for token efficiency
-    candidate_games = filtered_df.sort_values("avg_rating", ascending=False).head(top_k)
+    candidate_games = _candidate_games(candidate_mask, top_k)
+
+    if candidate_games.empty:
+        return np.zeros(catalog.n_games)
 
-    # Prepare text for LLM input
+    # Prepare text for LLM input; descriptions are only fetched for these top_k games
+    candidate_rows = catalog.id_index.lookup(candidate_games["bgg_id"].to_numpy())
+    candidate_details = catalog.details(candidate_rows, ["description"])
+    candidate_descriptions = candidate_details.get("description", pd.Series([""] * len(candidate_games)))
     descriptions = "\n\n".join([
-        f"Name: {row['name']}\nYear: {row['year_published']}\nDescription: {row.get('description', '')}"
-        for _, row in candidate_games.iterrows()
+        f"Name: {row['name']}\nYear: {row['year_published']}\nDescription: {description}"
+        for (_, row), description in zip(candidate_games.iterrows(), candidate_descriptions)
     ])
 
     prompt = f"""
@@ -201,7 +96,9 @@ def get_llm_scores(
     {descriptions}
     """
 
+    request_options = {} if timeout is None else {"timeout": timeout}
     response = client.chat.completions.create(
+        **request_options,
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are an expert board game recommender that outputs structured data."},
@@ -220,7 +117,7 @@ def get_llm_scores(
         # Manual fallback: strip formatting and ensure 2 columns
         lines = [line for line in csv_output.splitlines() if "," in line]
         if not lines:
-            return np.zeros(len(games_df))
+            return np.zeros(catalog.n_games)
 
         # Clean commas within quoted names and trim whitespace
         clean_lines = []
@@ -259,12 +156,10 @@ def get_llm_scores(
     llm_scores_df.dropna(subset=["bgg_id"], inplace=True)
 
     # Fill scores for all games
-    full_scores = np.zeros(len(games_df))
-    score_map = dict(zip(llm_scores_df["bgg_id"], llm_scores_df["llm_score"]))
-    for idx, row in games_df.iterrows():
-        bgg_id = row["bgg_id"] if "bgg_id" in games_df.columns else row["bgg_id"]
-        if bgg_id in score_map:
-            full_scores[idx] = score_map[bgg_id]
+    full_scores = np.zeros(catalog.n_games)
+    rows = catalog.id_index.lookup(llm_scores_df["bgg_id"].to_numpy(dtype=np.int64))
+    found = rows >= 0
+    full_scores[rows[found]] = llm_scores_df["llm_score"].to_numpy(dtype=float)[found]
 
     return full_scores
 
@@ -1,72 +1,164 @@
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
 import pandas as pd
 import numpy as np
-import warnings
 
-from cbf import get_cbf_scores
-from cf import get_cf_scores
-from llm import get_llm_scores
+from cbf import QueryEncoder, get_cbf_scores, get_cbf_scores_batch, bgg_ids as cbf_bgg_ids, manifest as cbf_manifest
+from cf import get_cf_scores, get_cf_store, get_cf_user_vectors
+from llm import get_llm_scores, llm_candidate_rows
+from neighbors import get_similar_games
+from catalog import get_catalog
+from result_cache import ResultCache, request_key
 
-warnings.filterwarnings('ignore')
+logger = logging.getLogger(__name__)
 
 ### Load games into games_df
-games_file = "./data/games_master_data.csv"
-
-
-def semicolon_to_list(value):
-    if pd.isna(value) or value == "":
-        return []
-    if isinstance(value, list):  # prevent double conversion
-        return value
-    return [item.strip() for item in str(value).split(';') if item.strip()]
-
-games_df = pd.read_csv(
-    games_file,
-    usecols=['bgg_id',
-             'name',
-             'description',
-             'image',
-             'thumbnail',
-             'bgg_link',
-             'avg_rating',
-             'bgg_rating',
-             'users_rated',
-             'game_weight',
-             'players_min',
-             'players_max',
-             'players_best',
-             'time_min',
-             'time_max',
-             'time_avg',
-             'simple_game_mechanics',
-             'simple_game_categories',
-             'game_types',
-             'year_published'],
-    
-    converters={'simple_game_mechanics': semicolon_to_list,
-                'simple_game_categories': semicolon_to_list,
-                'game_types': semicolon_to_list},
-    
-    dtype={'bgg_id':        'int64',
-           'avg_rating':    'float64',
-           'bgg_rating':    'float64',
-           'users_rated':   'int64',
-           'game_weight':   'float64',
-           'players_best':  'float64',
-           'players_min':   'int64',
-           'players_max':   'int64',
-           'players_best':  'float64',
-           'time_min':      'int64',
-           'time_max':      'int64',
-           'time_avg':      'int64'})
-
-games_df.rename(columns={'simple_game_categories': 'game_categories', 'simple_game_mechanics': 'game_mechanics'}, inplace=True)
-
-games_df = games_df.set_index("bgg_id", drop=False)
-n_games = games_df.shape[0]
+catalog = get_catalog()
+games_df = catalog.games_df
+n_games = catalog.n_games
+
+# columnar attribute filters, shared with the LLM candidate pool
+filter_engine = catalog.filter_engine
+
+# scores are combined by row, so every scorer's rows must be the catalog's rows
+catalog.check_aligned("CF store", get_cf_store().bgg_ids)
+catalog.check_aligned("CBF bundle", cbf_bgg_ids)
 
 # Toggle to include/exclude attribute-based filtering when inspecting hybrid scores.
 APPLY_ATTRIBUTE_FILTERS = True
 
+# Default per-scorer timeouts in seconds (None = wait). A scorer that times out
+# contributes a zero vector, which the zero-score reweighting below handles.
+SCORER_TIMEOUTS = {'cf': None, 'cbf': None, 'llm': 30.0}
+
+# shared by all requests; the LLM scorer mostly waits on the OpenAI round trip
+_scorer_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ensemble-scorer")
+
+# process-wide cache of ensemble_scores results, see cached_ensemble_scores
+result_cache = ResultCache(max_size=256, ttl=3600)
+
+# models and catalog behind the cached results: the CF store manifest (built from
+# a given npz), the CBF bundle manifest (with file checksums) and the catalog contents
+MODEL_VERSION = hashlib.sha256(json.dumps(
+    [get_cf_store().manifest, cbf_manifest, catalog.fingerprint], sort_keys=True
+).encode("utf-8")).hexdigest()[:16]
+
+### run scorers
+def run_scorers(scorers, timeouts=None, concurrent=True):
+    """
+    Run scorer callables (name -> zero-argument function) and collect their results.
+
+    With concurrent=True all scorers are started at once on the shared pool, and
+    each result is awaited until its timeout (seconds from the start, None = no limit).
+    A scorer that misses its timeout keeps running in the background and its
+    result is discarded. With concurrent=False the scorers run one after the
+    other in the calling thread and timeouts are not enforced.
+
+    Returns (results, status): results maps each name to its scores, or None if
+    the scorer was dropped; status maps it to 'ok', 'timeout' or 'error'.
+    """
+    timeouts = timeouts or {}
+    results, status = {}, {}
+
+    if concurrent:
+        start = time.monotonic()
+        futures = {name: _scorer_pool.submit(scorer) for name, scorer in scorers.items()}
+
+    for name, scorer in scorers.items():
+        results[name], status[name] = None, 'ok'
+        try:
+            if not concurrent:
+                results[name] = scorer()
+                continue
+            timeout = timeouts.get(name)
+            if timeout is not None:
+                timeout = max(0.0, start + timeout - time.monotonic())
+            results[name] = futures[name].result(timeout=timeout)
+        except FutureTimeoutError:
+            futures[name].cancel()
+            logger.warning("%s scorer timed out after %ss, using zero scores", name, timeouts[name])
+            status[name] = 'timeout'
+        except Exception:
+            logger.warning("%s scorer failed, using zero scores", name, exc_info=True)
+            status[name] = 'error'
+    return results, status
+
+### rank final scores
+class Ranking:
+    """
+    Final ensemble scores of one request, ranked on demand.
+
+    Games scoring below min_score are never returned. Pages are cut from the
+    best-first order of the top rows, which is computed with argpartition for
+    as many rows as requested so far (at least doubling each time), so "show
+    more" only reorders a few extra rows instead of rescoring the catalog.
+    """
+
+    columns = [
+        'bgg_id', 'name', 'avg_rating', 'game_categories',
+        'game_mechanics', 'game_weight', 'game_types',
+        'year_published', 'players_min', 'players_max'
+    ]
+
+    def __init__(self, final_scores, components, attrs=None, min_score=0.01):
+        self.scores = final_scores
+        self.components = components
+        self.attrs = attrs or {}
+        self._valid = np.flatnonzero(final_scores >= min_score)
+        self._order = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._valid)
+
+    def top_rows(self, n):
+        """Row positions of the n best games, best first, ties by row."""
+        n = min(n, len(self._valid))
+        if n > len(self._order):
+            k = min(len(self._valid), max(n, 2 * len(self._order)))
+            valid_scores = self.scores[self._valid]
+            if k < len(valid_scores):
+                # every game tied with the k-th best competes for the last places
+                threshold = -np.partition(-valid_scores, k - 1)[k - 1]
+                top = np.flatnonzero(valid_scores >= threshold)
+            else:
+                top = np.arange(len(valid_scores))
+            # the order is total (_valid is sorted by row), so each longer order
+            # keeps the rows already handed out as its prefix and pages never repeat
+            self._order = self._valid[top[np.lexsort((top, -valid_scores[top]))][:k]]
+        return self._order[:n]
+
+    def page(self, page=0, page_size=5) -> pd.DataFrame:
+        """Recommendations DataFrame of the given page (0-based), ranks continue across pages."""
+        start = page * page_size
+        rows = self.top_rows(start + page_size)[start:]
+        if len(rows) == 0:
+            recommendations = pd.DataFrame()
+            recommendations.attrs.update(self.attrs)
+            return recommendations
+
+        recommendations = catalog.frame(rows, self.columns)
+        recommendations['recommender_score'] = self.scores[rows].round(4)
+        for name in ('cf', 'cbf', 'llm'):
+            recommendations[f'{name}_score_component'] = self.components[name][rows].round(4)
+        recommendations['n_rank'] = range(start + 1, start + len(rows) + 1)
+        recommendations.attrs.update(self.attrs)
+        return recommendations
+
+# min-max normalize scores over the candidate rows, all other games get 0; a constant
+# candidate set becomes 1 like in get_cf_scores / get_cbf_scores, unless scores are all 0
+def _normalize_over(scores, candidates):
+    normalized = np.zeros(len(scores), dtype=scores.dtype)
+    candidate_scores = scores[candidates]
+    if len(candidate_scores) and candidate_scores.max() > candidate_scores.min():
+        normalized[candidates] = (candidate_scores - candidate_scores.min()) / (candidate_scores.max() - candidate_scores.min())
+    elif len(candidate_scores) and scores.any():
+        normalized[candidates] = 1
+    return normalized
+
 ### get enseble score
 def ensemble_scores(liked_games=None,
                     disliked_games=None,
@@ -75,7 +167,13 @@ def ensemble_scores(liked_games=None,
                     description=None,
                     alpha: float = 0.5,
                     beta: float = 0.33,
-                    n_recommendations: int = 5) -> pd.DataFrame:
+                    n_recommendations: int = 5,
+                    cf_state=None,
+                    concurrent: bool = True,
+                    scorer_timeouts=None,
+                    latency_budget: float = None,
+                    return_ranking: bool = False,
+                    component_store=None) -> pd.DataFrame:
     """
 :    Ensemble CF, CBF, and LLM models using a hybrid weighting formula and filter
 
@@ -85,6 +183,23 @@ def ensemble_scores(liked_games=None,
     disliked_games  - list/array of bgg_ids (integers)
     exclude_games  - list/array of bgg_ids (integers)
     description - string for llm
+    cf_state - optional cf.FoldInState kept per session, so changing the liked
+        games only applies rank-one updates to the CF fold-in
+    concurrent - run the CF, CBF and LLM scorers in parallel threads
+    scorer_timeouts - dict of per-scorer timeouts in seconds ('cf', 'cbf', 'llm'),
+        overriding SCORER_TIMEOUTS; a timed-out scorer contributes zeros. The
+        LLM timeout is also passed to the OpenAI request itself.
+    latency_budget - seconds the scorers may take in total; every scorer still
+        running at the deadline is dropped like a timeout. Implies concurrent.
+        A scorer that raises is dropped the same way.
+    return_ranking - return the Ranking of all scored games instead of its
+        first page, so further pages can be fetched without rescoring
+    component_store - optional component_store.ComponentStore kept per session;
+        CF / CBF / LLM vectors whose inputs did not change since a recent
+        request are taken from it instead of being recomputed. CF / CBF are
+        kept over the full catalog, the LLM vector is keyed on the description
+        and reused across filter changes that only narrow the pool of games it
+        scored. attrs['reused_components'] lists the vectors taken from the store
     attributes - dictionary
         attributes = {
         'game_types': ['Abstract Game','Family Game'] # list of game types
@@ -102,25 +217,84 @@ def ensemble_scores(liked_games=None,
     'game_mechanics', 'game_weight', 'game_types',
     'year_published', 'players_min', 'players_max'
     'recommender_score', 'cf_score_component', 'cbf_score_component', 'llm_score_component'
+
+    recommendations.attrs['components'] lists the scorers that contributed to the
+    scores, and recommendations.attrs['scorer_status'] maps each scorer to 'ok',
+    'timeout' or 'error'.
     
     -------
     pd.DataFrame
         Combined recommendations with composite score.
     """
 
-    # get cf_scores
-
-    cf_scores = get_cf_scores(liked_items = liked_games)
-    
-    # get cbf_scores
-    cbf_scores = get_cbf_scores(attributes=attributes)
-
-    # get llm_scores
-    llm_scores = get_llm_scores(
-        user_description=description or "",
-        attributes=attributes,
+    # get candidate mask, shared by the scorers and the final filtering
+    if APPLY_ATTRIBUTE_FILTERS:
+        candidate_mask = filter_engine.mask(attributes)
+    else:
+        candidate_mask = np.ones(n_games, dtype=bool)
+
+    # scorers only evaluate (and normalize over) the surviving games
+    candidates = None if candidate_mask.all() else np.flatnonzero(candidate_mask)
+
+    timeouts = {**SCORER_TIMEOUTS, **(scorer_timeouts or {})}
+    if latency_budget is not None:
+        concurrent = True
+        timeouts = {name: latency_budget if t is None else min(t, latency_budget) for name, t in timeouts.items()}
+
+    # with a component store, CF / CBF vectors are computed (and kept) over the full
+    # catalog and normalized over the candidates afterwards
+    score_candidates = candidates if component_store is None else None
+    scorers = {
+        # get cf_scores
+        'cf': lambda: get_cf_scores(liked_items=liked_games, fold_in_state=cf_state, candidates=score_candidates),
+        # get cbf_scores
+        'cbf': lambda: get_cbf_scores(attributes=attributes, candidates=score_candidates),
+        # get llm_scores
+        'llm': lambda: get_llm_scores(
+            user_description=description or "",
+            attributes=attributes,
+            candidate_mask=candidate_mask,
+            timeout=timeouts.get('llm'),
+        ),
+    }
+
+    stored = {}
+    if component_store is not None:
+        # the LLM prompt depends on the description and the pool of candidates it lists;
+        # a stored LLM vector only serves requests whose pool it scored completely
+        llm_rows = llm_candidate_rows(candidate_mask)
+        component_keys = {
+            'cf': tuple(sorted({int(gid) for gid in (liked_games or [])})),
+            'cbf': QueryEncoder.canonical_key(attributes or {}),
+            'llm': " ".join((description or "").split()),
+        }
+        for name in scorers:
+            cached = component_store.get(name, component_keys[name], rows=llm_rows if name == 'llm' else None)
+            if cached is not None:
+                stored[name] = cached
+        scorers = {name: scorer for name, scorer in scorers.items() if name not in stored}
+
+    scores, scorer_status = run_scorers(scorers, timeouts=timeouts, concurrent=concurrent)
+
+    if component_store is not None:
+        for name, component_scores in scores.items():
+            if component_scores is not None:
+                component_store.set(name, component_keys[name], component_scores,
+                                    scored_rows=llm_rows if name == 'llm' else None)
+        scores.update(stored)
+        scorer_status.update({name: 'ok' for name in stored})
+        if candidates is not None:
+            for name in ('cf', 'cbf'):
+                if scores[name] is not None:
+                    scores[name] = _normalize_over(scores[name], candidates)
+            # LLM scores are not min-max normalized, only masked
+            if scores['llm'] is not None:
+                scores['llm'] = np.where(candidate_mask, scores['llm'], 0)
+
+    cf_scores, cbf_scores, llm_scores = (
+        np.zeros(n_games) if scores[name] is None else scores[name] for name in ('cf', 'cbf', 'llm')
     )
-    
+
     # convert and validate input
     cf_scores = np.array(cf_scores)
     cbf_scores = np.array(cbf_scores)
@@ -142,6 +316,11 @@ def ensemble_scores(liked_games=None,
     elif cbf_zero and not cf_zero:
         alpha = 1.0
 
+    # scorers whose (reweighted) vector makes it into the hybrid score
+    weights = {'cf': alpha * (1 - beta), 'cbf': (1 - alpha) * (1 - beta), 'llm': beta}
+    is_zero = {'cf': cf_zero, 'cbf': cbf_zero, 'llm': llm_zero}
+    components = [name for name in ('cf', 'cbf', 'llm') if weights[name] > 0 and not is_zero[name]]
+
     # compute hybrid components
     cf_component = cf_scores * alpha
     cbf_component = cbf_scores * (1 - alpha)
@@ -159,79 +338,197 @@ def ensemble_scores(liked_games=None,
     attributes = attributes or {}
 
     # --- Apply exclusion filters ---
-    for gid in liked_games + disliked_games + exclude_games:
-        if gid in games_df.index:
-            idx = games_df.index.get_loc(gid)
-            final_scores[idx] = 0
+    final_scores[catalog.rows_for(list(liked_games) + list(disliked_games) + list(exclude_games))] = 0
     
     # --- Apply attribute filters ---
-    if APPLY_ATTRIBUTE_FILTERS and attributes:
-        # Multi-label attributes
-        for attr_name in ['game_categories', 'game_mechanics', 'game_types']:
-            selected = attributes.get(attr_name, [])
-            if selected and any(isinstance(s, str) and s.strip() for s in selected):
-                selected_clean = [s.strip().lower() for s in selected if isinstance(s, str) and s.strip()]
-                mask = games_df[attr_name].apply(
-                    lambda ga: isinstance(ga, list) and len(ga) > 0 and 
-                               any(isinstance(a, str) and a.strip().lower() in selected_clean for a in ga)
-                )
-                final_scores[~mask.values] = 0
-
-        # Numeric attributes
-        if 'game_weight' in attributes:
-            weight_range = attributes['game_weight']
-            if isinstance(weight_range, (list, tuple)) and len(weight_range) == 2:
-                w_min, w_max = weight_range
-                mask = (games_df['game_weight'] >= w_min) & (games_df['game_weight'] <= w_max)
-                final_scores[~mask.values] = 0
-
-        if 'players' in attributes:
-            players_range = attributes['players']
-            if isinstance(players_range, (list, tuple)) and len(players_range) == 2:
-                p_min, p_max = players_range
-                mask = (games_df['players_max'] >= p_min) & (games_df['players_min'] <= p_max)
-                final_scores[~mask.values] = 0
-
-        if 'play_time' in attributes:
-            time_range = attributes['play_time']
-            if isinstance(time_range, (list, tuple)) and len(time_range) == 2:
-                t_min, t_max = time_range
-                mask = (games_df['time_max'] >= t_min) & (games_df['time_min'] <= t_max)
-                final_scores[~mask.values] = 0
-
-        if 'year_published' in attributes:
-            year_range = attributes['year_published']
-            if isinstance(year_range, (list, tuple)) and len(year_range) == 2:
-                y_min, y_max = year_range
-                mask = (games_df['year_published'] >= y_min) & (games_df['year_published'] <= y_max)
-                final_scores[~mask.values] = 0
-
-        if 'min_rating' in attributes:
-            min_rating = attributes['min_rating']
-            if isinstance(min_rating, (list, tuple)) and len(min_rating) > 0:
-                min_rating = min_rating[0]
-                mask = (games_df['avg_rating'] >= min_rating)
-                final_scores[~mask.values] = 0
+    final_scores[~candidate_mask] = 0
+
+    ranking = Ranking(
+        final_scores,
+        {'cf': cf_component, 'cbf': cbf_component, 'llm': llm_component},
+        attrs={'components': components, 'scorer_status': scorer_status, 'reused_components': sorted(stored)},
+    )
+    if return_ranking:
+        return ranking
 
     # Select top N recommendations ---
-    valid_idx = np.where(final_scores >= 0.01)[0]
-    if len(valid_idx) == 0:
-        return pd.DataFrame(), np.array([]), np.array([]), np.array([]), np.array([])
+    return ranking.page(0, n_recommendations)
+
+### cached ensemble score
+def cached_ensemble_scores(liked_games=None,
+                           disliked_games=None,
+                           exclude_games=None,
+                           attributes=None,
+                           description=None,
+                           alpha: float = 0.5,
+                           beta: float = 0.33,
+                           n_recommendations: int = 5,
+                           cache: ResultCache = None,
+                           **kwargs) -> pd.DataFrame:
+    """
+    ensemble_scores behind a result cache (result_cache unless cache is given),
+    keyed by the canonical form of the request. Other keyword arguments (cf_state,
+    concurrent, scorer_timeouts, latency_budget, component_store) are passed
+    through on a miss.
+
+    Results where a scorer was dropped are not cached, so a slow or failed LLM
+    call is retried by the next identical request. Neither are results built from
+    component_store vectors: an LLM vector reused for a narrower pool is not what
+    a fresh request would get, and the result cache is shared (and on disk). Keys include MODEL_VERSION,
+    so results cached by an older model or catalog (e.g. on disk) are not served.
+    Only first pages are cached; call ensemble_scores directly for a Ranking.
+    """
+    if kwargs.get('return_ranking'):
+        raise ValueError("cached_ensemble_scores caches DataFrames; use ensemble_scores(return_ranking=True)")
 
-    top_n_idx = valid_idx[np.argsort(final_scores[valid_idx])[::-1][:n_recommendations]]
+    cache = result_cache if cache is None else cache
+    key = request_key(liked_games, disliked_games, exclude_games, attributes, description,
+                      alpha=alpha, beta=beta, n_recommendations=n_recommendations, version=MODEL_VERSION)
 
-    recommendations = games_df.iloc[top_n_idx][[
-        'bgg_id', 'name', 'avg_rating', 'game_categories',
-        'game_mechanics', 'game_weight', 'game_types',
-        'year_published', 'players_min', 'players_max'
-    ]].copy()
+    recommendations = cache.get(key)
+    if recommendations is None:
+        recommendations = ensemble_scores(liked_games, disliked_games, exclude_games,
+                                          attributes=attributes, description=description,
+                                          alpha=alpha, beta=beta, n_recommendations=n_recommendations,
+                                          **kwargs)
+        attrs = recommendations.attrs
+        if all(status == 'ok' for status in attrs.get('scorer_status', {}).values()) and not attrs.get('reused_components'):
+            cache.set(key, recommendations)
+
+    # callers get their own copy, the cached frame stays untouched
+    return recommendations.copy()
+
+### batch ensemble scores for offline jobs
+def _normalize_masked(scores, mask):
+    # min-max normalize each row over its masked entries, everything else becomes 0;
+    # rows constant over their mask become 1 there, like get_cf_scores / get_cbf_scores
+    # with candidates, unless the row is all zeros (no likes / empty query)
+    with np.errstate(invalid='ignore'):
+        lo = np.where(mask, scores, np.inf).min(axis=1, keepdims=True)
+        span = np.where(mask, scores, -np.inf).max(axis=1, keepdims=True) - lo
+        valid = mask & (span > 0)
+        constant = mask & (span == 0) & scores.any(axis=1, keepdims=True)
+        normalized = np.where(valid, (scores - lo) / np.where(valid, span, 1), 0)
+        return np.where(constant, 1, normalized).astype(np.float32)
+
+def ensemble_scores_batch(requests,
+                          alpha: float = 0.5,
+                          n_recommendations: int = 5,
+                          block_size: int = 256):
+    """
+    Top-n CF + CBF recommendations for many users at once, for offline jobs.
+
+    requests - list of dicts with the ensemble_scores arguments 'liked_games',
+        'disliked_games', 'exclude_games' and 'attributes' (all optional)
+
+    Users are folded in with one batched CF solve, CBF similarities come from
+    one query-matrix multiply per block, and identical attribute filters share
+    one mask. Scores are computed for block_size users at a time, so at most a
+    (block_size, n_games) block is alive. Per user the result matches
+    ensemble_scores without a description: both scores are normalized over the
+    filtered candidates and the zero-score reweighting of alpha applies. The
+    LLM scorer is not used (beta = 0).
+
+    Returns a dict of compact arrays, one row per request, best first:
+        'bgg_id'                (n_requests, n_recommendations) int64, -1 padded
+        'recommender_score'     (n_requests, n_recommendations) float32, 0 padded
+        'cf_score_component'    (n_requests, n_recommendations) float32
+        'cbf_score_component'   (n_requests, n_recommendations) float32
+        'n_results'             (n_requests,) number of valid entries per row
+    """
+    requests = list(requests)
+    n_requests = len(requests)
+    n = min(n_recommendations, n_games)
+    result = {
+        'bgg_id': np.full((n_requests, n), -1, dtype=np.int64),
+        'recommender_score': np.zeros((n_requests, n), dtype=np.float32),
+        'cf_score_component': np.zeros((n_requests, n), dtype=np.float32),
+        'cbf_score_component': np.zeros((n_requests, n), dtype=np.float32),
+        'n_results': np.zeros(n_requests, dtype=np.int64),
+    }
+    if n_requests == 0 or n == 0:
+        return result
+
+    # one filter mask per distinct attributes dict
+    mask_ids, masks = [], {}
+    for request in requests:
+        attributes = request.get('attributes') or {}
+        key = json.dumps(attributes, sort_keys=True, default=str) if APPLY_ATTRIBUTE_FILTERS else ''
+        if key not in masks:
+            masks[key] = filter_engine.mask(attributes) if APPLY_ATTRIBUTE_FILTERS else np.ones(n_games, dtype=bool)
+        mask_ids.append(key)
+
+    # batched CF fold-in
+    U = get_cf_user_vectors([request.get('liked_games') or [] for request in requests])
+    V = get_cf_store().V_quantized
+    bgg_ids = games_df['bgg_id'].to_numpy()
+
+    for start in range(0, n_requests, block_size):
+        block = requests[start:start + block_size]
+        rows = np.arange(len(block))
+        mask = np.stack([masks[key] for key in mask_ids[start:start + block_size]])
+
+        # get cf_scores and cbf_scores, normalized over each user's candidates
+        cf_scores = _normalize_masked(np.asarray(V.dot(U[start:start + block_size].T)).T, mask)
+        cbf_scores = _normalize_masked(
+            get_cbf_scores_batch([request.get('attributes') or {} for request in block], normalize=False), mask
+        )
+
+        # weight if one vector is zero
+        cf_zero = ~cf_scores.any(axis=1)
+        cbf_zero = ~cbf_scores.any(axis=1)
+        user_alpha = np.where(cf_zero & ~cbf_zero, 0.0, np.where(cbf_zero & ~cf_zero, 1.0, alpha))[:, None]
+
+        cf_component = cf_scores * user_alpha
+        cbf_component = cbf_scores * (1 - user_alpha)
+        final_scores = cf_component + cbf_component
+
+        # --- Apply exclusion and attribute filters ---
+        for i, request in enumerate(block):
+            excluded = [
+                gid
+                for name in ('liked_games', 'disliked_games', 'exclude_games')
+                for gid in (request.get(name) or [])
+            ]
+            final_scores[i, catalog.rows_for(excluded)] = 0
+        final_scores[~mask] = 0
+
+        # top n per user
+        final_scores[final_scores < 0.01] = -np.inf
+        top = np.argpartition(-final_scores, n - 1, axis=1)[:, :n] if n < n_games else np.tile(np.arange(n_games), (len(block), 1))
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(final_scores, top, axis=1), axis=1, kind='stable'), axis=1)
+        top_scores = final_scores[rows[:, None], top]
+        valid = np.isfinite(top_scores)
+
+        stop = start + len(block)
+        result['bgg_id'][start:stop] = np.where(valid, bgg_ids[top], -1)
+        result['recommender_score'][start:stop] = np.where(valid, top_scores, 0)
+        result['cf_score_component'][start:stop] = np.where(valid, cf_component[rows[:, None], top], 0)
+        result['cbf_score_component'][start:stop] = np.where(valid, cbf_component[rows[:, None], top], 0)
+        result['n_results'][start:stop] = valid.sum(axis=1)
+
+    return result
+
+### "more like this" from the precomputed neighbor tables
+def more_like_this(seed_games, n_recommendations: int = 5, kind: str = "blend") -> pd.DataFrame:
+    """
+    Games most similar to one or a few seed games (list of bgg_ids), answered
+    from the neighbor tables built by neighbors.py instead of a full scoring pass.
 
-    recommendations['recommender_score'] = final_scores[top_n_idx].round(4)
-    recommendations['cf_score_component'] = cf_component[top_n_idx].round(4)
-    recommendations['cbf_score_component'] = cbf_component[top_n_idx].round(4)
-    recommendations['llm_score_component'] = llm_component[top_n_idx].round(4)
-    recommendations['n_rank'] = range(1, len(recommendations) + 1)
+    kind - 'cf', 'cbf' or 'blend' similarity
 
+    Returns the same columns as ensemble_scores, with the merged neighbor
+    similarity as 'recommender_score'.
+    """
+    # over-fetch so games missing from games_df don't shrink the result
+    bgg_ids, scores = get_similar_games(seed_games, n=2 * n_recommendations, kind=kind)
+    rows = catalog.id_index.lookup(bgg_ids)
+    known = rows >= 0
+    rows, scores = rows[known][:n_recommendations], scores[known][:n_recommendations]
+
+    recommendations = catalog.frame(rows, Ranking.columns)
+    recommendations['recommender_score'] = scores.round(4)
+    recommendations['n_rank'] = range(1, len(recommendations) + 1)
     return recommendations
 
 ### Show recommendationsget_hybrid_recommendations
@@ -282,11 +579,12 @@ def display_recommendations(liked_games,
         bgg_id = row["bgg_id"]
         score = row["recommender_score"]
 
-        if bgg_id not in games_df.index:
+        rows = catalog.id_index.lookup([bgg_id])
+        if rows[0] < 0:
             print(f"Game ID {bgg_id} not found in games_df.")
             continue
 
-        game = games_df.loc[bgg_id]
+        game = catalog.frame(rows, Ranking.columns).iloc[0]
 
         print(f"*** {bgg_id} {game['name']:<35} Recommender score: {score:.4f}")
         cf_component = row.get("cf_score_component", 0.0)
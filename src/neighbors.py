@@ -0,0 +1,166 @@
+"""
+neighbors.py
+Precomputed item-to-item neighbor tables for "more like this" queries.
+
+For every game the top-K most similar games are stored under three
+similarities: CF (cosine between rows of V), CBF (cosine between the CBF
+feature rows) and a blend of the two. Tables are CSR-like: the
+neighbors of row i are indices[indptr[i]:indptr[i + 1]] (int32 rows) with
+float16 scores, plus the BGGId of every row.
+
+Build them offline with:
+
+    python src/neighbors.py
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from id_index import IdIndex
+
+NEIGHBORS_DIR = "./data/neighbors"
+NEIGHBOR_KINDS = ("cf", "cbf", "blend")
+
+
+class NeighborTable:
+    """Top-K neighbors of every game, with score merging for few-seed queries."""
+
+    def __init__(self, bgg_ids, indptr, indices, scores):
+        self.bgg_ids = np.asarray(bgg_ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.id_index = IdIndex(self.bgg_ids)
+
+    def save(self, table_dir):
+        os.makedirs(table_dir, exist_ok=True)
+        for name in ["bgg_ids", "indptr", "indices", "scores"]:
+            tmp_path = os.path.join(table_dir, f"{name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(table_dir, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, table_dir):
+        return cls(
+            np.load(os.path.join(table_dir, "bgg_ids.npy")),
+            np.load(os.path.join(table_dir, "indptr.npy")),
+            np.load(os.path.join(table_dir, "indices.npy"), mmap_mode="r"),
+            np.load(os.path.join(table_dir, "scores.npy"), mmap_mode="r"),
+        )
+
+    def similar_to(self, seed_ids, n=10):
+        """
+        Games most similar to one or a few seed BGGIds.
+
+        Neighbor lists of the seeds are concatenated and scores of games that
+        appear in several lists are summed; seeds themselves are excluded.
+        Returns (bgg_ids, scores), best first.
+        """
+        seed_rows = self.id_index.rows_for(seed_ids)
+        if len(seed_rows) == 0:
+            return np.array([], dtype=self.bgg_ids.dtype), np.array([], dtype=np.float32)
+
+        rows = np.concatenate([self.indices[self.indptr[r]:self.indptr[r + 1]] for r in seed_rows])
+        scores = np.concatenate([self.scores[self.indptr[r]:self.indptr[r + 1]] for r in seed_rows])
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores.astype(np.float32)).astype(np.float32)
+
+        keep = ~np.isin(candidates, seed_rows)
+        candidates, totals = candidates[keep], totals[keep]
+        top = np.argsort(-totals, kind="stable")[:n]
+        return self.bgg_ids[candidates[top]], totals[top]
+
+
+def _normalize_rows(X):
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.where(norms > 0, norms, 1)
+
+
+def top_k_neighbors(feature_sets, weights, k=50, block_size=1024):
+    """
+    Top-k neighbors of every row under sum_i weights[i] * cosine(feature_sets[i]).
+
+    All feature sets must have the same rows. Similarities are computed in
+    blocks of block_size rows so only a (block_size, n) matrix is alive at a
+    time; the row itself and non-positive similarities are dropped.
+
+    Returns (indptr, indices, scores) of the CSR-like table.
+    """
+    feature_sets = [_normalize_rows(X) for X in feature_sets]
+    n = feature_sets[0].shape[0]
+    k = min(k, n - 1)
+
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        sim = sum(w * (X[start:stop] @ X.T) for X, w in zip(feature_sets, weights))
+        sim[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        top = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(sim, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+
+    keep = scores > 0
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(keep.sum(axis=1))
+    return indptr, indices[keep], scores[keep].astype(np.float16)
+
+
+def build_neighbor_tables(k=50, cf_weight=0.5, block_size=1024, neighbors_dir=NEIGHBORS_DIR):
+    """Build and save the CF, CBF and blended neighbor tables."""
+    from cf import get_cf_store
+    import cbf
+
+    store = get_cf_store()
+    cf_ids = store.bgg_ids
+    cbf_ids = np.asarray(cbf.bgg_ids)
+    cbf_features = np.hstack([cbf.features_csr.toarray(), cbf.numeric_features])
+
+    tables = {
+        "cf": (cf_ids, [store.V], [1.0]),
+        "cbf": (cbf_ids, [cbf_features], [1.0]),
+    }
+
+    # blended similarity over the games known to both models, in CF row order
+    cbf_rows = IdIndex(cbf_ids).lookup(cf_ids)
+    shared = cbf_rows >= 0
+    tables["blend"] = (
+        cf_ids[shared],
+        [np.asarray(store.V)[shared], cbf_features[cbf_rows[shared]]],
+        [cf_weight, 1 - cf_weight],
+    )
+
+    for kind, (bgg_ids, feature_sets, weights) in tables.items():
+        indptr, indices, scores = top_k_neighbors(feature_sets, weights, k=k, block_size=block_size)
+        NeighborTable(bgg_ids, indptr, indices, scores).save(os.path.join(neighbors_dir, kind))
+        print(f"Saved {kind} neighbor table: {len(bgg_ids)} games, {len(indices)} neighbors")
+
+
+_neighbor_tables = {}
+_neighbor_tables_lock = threading.Lock()
+
+
+def get_neighbor_table(kind="blend"):
+    """Process-wide neighbor table of the given kind, loaded on first use."""
+    if kind not in NEIGHBOR_KINDS:
+        raise ValueError(f"kind must be one of {NEIGHBOR_KINDS}, got {kind!r}")
+    if kind not in _neighbor_tables:
+        with _neighbor_tables_lock:
+            if kind not in _neighbor_tables:
+                _neighbor_tables[kind] = NeighborTable.load(os.path.join(NEIGHBORS_DIR, kind))
+    return _neighbor_tables[kind]
+
+
+def get_similar_games(seed_ids, n=10, kind="blend"):
+    """(bgg_ids, scores) of the n games most similar to the seed BGGIds."""
+    return get_neighbor_table(kind).similar_to(seed_ids, n=n)
+
+
+if __name__ == "__main__":
+    build_neighbor_tables()
@@ -0,0 +1,171 @@
+"""
+result_cache.py
+Cache of recommendation results for repeated identical requests.
+
+Requests are keyed by a sha256 of their canonical form (see request_key), so
+the same sidebar state hits the cache regardless of list order, duplicates or
+whitespace. The key also holds a version string of the models and catalog
+that produced the result, so a retrained or rebuilt artifact never serves
+results cached before it. Entries expire after a TTL and the least recently
+used ones are evicted beyond max_size. With disk_dir set, entries are also
+pickled to disk so the cache survives restarts; disk I/O happens outside the
+lock, and the disk tier is pruned back to max_size every prune_every writes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+LABEL_ATTRIBUTES = ["game_categories", "game_mechanics", "game_types"]
+
+
+def _canonical_ids(ids):
+    return sorted({int(i) for i in (ids if ids is not None else [])})
+
+
+def _canonical_attributes(attributes):
+    canonical = {}
+    for name, value in (attributes or {}).items():
+        if value is None or (isinstance(value, (list, tuple)) and len(value) == 0):
+            continue
+        if name in LABEL_ATTRIBUTES:
+            value = sorted({v.strip() for v in value if isinstance(v, str) and v.strip()})
+        elif isinstance(value, (list, tuple)):
+            value = [round(float(v), 6) for v in value]
+        else:
+            value = round(float(value), 6)
+        canonical[name] = value
+    return canonical
+
+
+def request_key(liked_games=None, disliked_games=None, exclude_games=None, attributes=None, description=None,
+                alpha=0.5, beta=0.33, n_recommendations=5, version=""):
+    """
+    sha256 hex digest of the canonical form of an ensemble_scores request;
+    version identifies the models and catalog the result depends on.
+    """
+    canonical = {
+        "version": str(version),
+        "liked": _canonical_ids(liked_games),
+        "disliked": _canonical_ids(disliked_games),
+        "exclude": _canonical_ids(exclude_games),
+        "attributes": _canonical_attributes(attributes),
+        "description": " ".join((description or "").split()),
+        "alpha": round(float(alpha), 6),
+        "beta": round(float(beta), 6),
+        "n": int(n_recommendations),
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a TTL and an optional on-disk backend."""
+
+    def __init__(self, max_size=256, ttl=3600, disk_dir=None, prune_every=32):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._writes_since_prune = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key, entry):
+        tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._disk_path(key))
+
+    def _prune_disk(self):
+        # keep at most max_size entries on disk, oldest first out
+        paths = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".pkl")]
+        if len(paths) > self.max_size:
+            paths.sort(key=lambda path: os.path.getmtime(path))
+            for path in paths[:len(paths) - self.max_size]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _insert(self, key, entry):
+        # callers hold self._lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        """Cached value of key, or default if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key)
+
+        expired = entry is not None and entry[0] <= time.time()
+        with self._lock:
+            if entry is None or expired:
+                self._entries.pop(key, None)
+                self.misses += 1
+            else:
+                self._insert(key, entry)
+                self.hits += 1
+        if expired and self.disk_dir:
+            self._remove_disk(key)
+        return default if entry is None or expired else entry[1]
+
+    def set(self, key, value):
+        entry = (time.time() + self.ttl, value)
+        with self._lock:
+            self._insert(key, entry)
+            self._writes_since_prune += 1
+            prune = self._writes_since_prune >= self.prune_every
+            if prune:
+                self._writes_since_prune = 0
+        if self.disk_dir:
+            self._write_disk(key, entry)
+            if prune:
+                self._prune_disk()
+
+    def clear(self):
+        with self._lock:
+            if self.disk_dir:
+                for key in list(self._entries) + [
+                    name[:-4] for name in os.listdir(self.disk_dir) if name.endswith(".pkl")
+                ]:
+                    self._remove_disk(key)
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
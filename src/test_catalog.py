@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog as catalog_module
+from catalog import SideStore, load_catalog, memory_report, side_store_dir
+
+
+def _write_games(path, rng, n_games=50):
+    games = pd.DataFrame({
+        "bgg_id": rng.permutation(np.arange(1, n_games + 1) * 11),
+        "name": [f"Game {i}" for i in range(n_games)],
+        "description": [f"About game {i} – ünïcode" if i % 7 else "" for i in range(n_games)],
+        "image": [f"https://example.com/{i}.png" for i in range(n_games)],
+        "bgg_link": [f"https://boardgamegeek.com/boardgame/{i}" for i in range(n_games)],
+        "avg_rating": rng.uniform(4, 9, n_games).round(5),
+        "bgg_rating": rng.uniform(4, 9, n_games).round(5),
+        "users_rated": rng.integers(10, 100_000, n_games),
+        "game_weight": rng.uniform(1, 5, n_games).round(4),
+        "players_min": rng.integers(1, 3, n_games),
+        "players_max": rng.integers(3, 9, n_games),
+        "players_best": rng.integers(2, 5, n_games).astype(float),
+        "time_min": rng.integers(10, 60, n_games),
+        "time_max": rng.integers(60, 300, n_games),
+        "time_avg": rng.integers(30, 120, n_games),
+        "year_published": rng.integers(1990, 2025, n_games),
+        "simple_game_categories": [["Fantasy;Wargame", "Economic", "", "Party; Fantasy "][i % 4] for i in range(n_games)],
+        "simple_game_mechanics": [["Dice Rolling", "Trading;Dice Rolling"][i % 2] for i in range(n_games)],
+        "game_types": [["Thematic", "Family"][i % 2] for i in range(n_games)],
+    })
+    # a duplicated game: the first row of each bgg_id is kept
+    games = pd.concat([games, games.iloc[[3]].assign(name="Duplicate")], ignore_index=True)
+    games.to_csv(path, index=False)
+    return games.drop_duplicates("bgg_id").sort_values("bgg_id").reset_index(drop=True)
+
+
+@pytest.fixture
+def games_csv(tmp_path, rng):
+    path = str(tmp_path / "games_master_data.csv")
+    return path, _write_games(path, rng)
+
+
+def test_catalog_rows_are_sorted_and_unique(games_csv):
+    path, games = games_csv
+    catalog = load_catalog(path)
+
+    np.testing.assert_array_equal(catalog.bgg_ids, games["bgg_id"])
+    assert catalog.n_games == len(games)
+    np.testing.assert_array_equal(catalog.rows_for([games["bgg_id"][9], -5, games["bgg_id"][2]]), [9, 2])
+    catalog.check_aligned("test artifact", games["bgg_id"])
+    with pytest.raises(ValueError):
+        catalog.check_aligned("test artifact", games["bgg_id"][::-1])
+
+
+def test_frame_matches_a_full_read(games_csv):
+    path, games = games_csv
+    catalog = load_catalog(path)
+    rows = np.array([7, 0, 31, 49])
+    columns = ["bgg_id", "name", "avg_rating", "users_rated", "game_categories", "game_mechanics", "description", "image"]
+    frame = catalog.frame(rows, columns)
+
+    expected = games.iloc[rows]
+    assert list(frame.columns) == columns
+    np.testing.assert_array_equal(frame.index, expected["bgg_id"])
+    assert frame["name"].tolist() == expected["name"].tolist()
+    assert frame["users_rated"].dtype == np.int64 and frame["avg_rating"].dtype == np.float64
+    np.testing.assert_allclose(frame["avg_rating"], expected["avg_rating"], rtol=1e-6)
+    assert frame["game_categories"].tolist() == [
+        catalog_module.semicolon_to_list(value) for value in expected["simple_game_categories"]
+    ]
+    assert frame["image"].tolist() == expected["image"].tolist()
+    assert [d if isinstance(d, str) else "" for d in frame["description"]] == expected["description"].fillna("").tolist()
+
+
+def test_filter_engine_uses_the_label_columns(games_csv):
+    path, games = games_csv
+    catalog = load_catalog(path)
+    mask = catalog.filter_engine.mask({"game_categories": ["fantasy"], "players": [8, 8]})
+    expected = games["simple_game_categories"].str.contains("Fantasy") & (games["players_max"] >= 8)
+    np.testing.assert_array_equal(mask, expected)
+
+
+def test_fingerprint_follows_the_contents(games_csv, tmp_path):
+    path, games = games_csv
+    fingerprint = load_catalog(path).fingerprint
+    assert load_catalog(path).fingerprint == fingerprint
+
+    games.loc[4, "avg_rating"] += 0.5
+    changed_path = str(tmp_path / "changed.csv")
+    games.to_csv(changed_path, index=False)
+    assert load_catalog(changed_path).fingerprint != fingerprint
+
+
+
+def test_numeric_columns_are_downcast(games_csv):
+    path, games = games_csv
+    games_df = load_catalog(path).games_df
+    assert games_df["users_rated"].dtype == np.int32
+    assert games_df["players_min"].dtype == np.int16
+    assert games_df["year_published"].dtype == np.int16
+    assert games_df["avg_rating"].dtype == np.float32
+    assert "description" not in games_df and "image" not in games_df
+    np.testing.assert_array_equal(games_df["users_rated"], games["users_rated"])
+
+
+def test_details_are_read_from_the_side_store(games_csv):
+    path, games = games_csv
+    catalog = load_catalog(path)
+    assert catalog.side_store.store_dir == side_store_dir(path)
+
+    rows = np.arange(len(games))
+    details = catalog.details(rows)
+    assert list(details.columns) == ["description", "image", "bgg_link"]
+    np.testing.assert_array_equal(details.index, games["bgg_id"])
+    assert details["image"].tolist() == games["image"].tolist()
+    # empty fields are read back as missing
+    missing = (games["description"] == "").to_numpy()
+    assert missing.any() and details["description"][missing].isna().all()
+    assert details["description"][~missing].tolist() == games["description"][~missing].tolist()
+    assert list(catalog.details([2], ["description", "full_description"]).columns) == ["description"]
+
+
+def test_side_store_is_rebuilt_when_the_csv_changes(games_csv, rng):
+    path, _ = games_csv
+    catalog = load_catalog(path)
+    store_dir = side_store_dir(path)
+    assert SideStore.is_current(store_dir, path, catalog.bgg_ids)
+    built = os.path.getmtime(os.path.join(store_dir, "manifest.json"))
+
+    load_catalog(path)
+    assert os.path.getmtime(os.path.join(store_dir, "manifest.json")) == built
+
+    games = _write_games(path, np.random.default_rng(1), n_games=60)
+    assert not SideStore.is_current(store_dir, path, catalog.bgg_ids)
+    catalog = load_catalog(path)
+    assert SideStore.is_current(store_dir, path, catalog.bgg_ids)
+    assert catalog.details([59])["image"].tolist() == [games["image"].iloc[59]]
+
+
+def test_memory_report_shrinks(games_csv):
+    path, _ = games_csv
+    report = memory_report(path)
+    assert report["after"] == report["games_df"] + report["labels"]
+    assert report["after"] < report["before"]
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from conftest import requires_data
+
+pytestmark = requires_data
+
+SAMPLE_ATTRIBUTES = {
+    "game_categories": ["Abstract / Strategy", "Animals / Nature"],
+    "game_mechanics": ["Team Play"],
+    "game_types": ["Customizable"],
+    "game_weight": [2.8],
+    "players": [4],
+    "play_time": [90],
+}
+
+
+@pytest.fixture(scope="module")
+def cbf():
+    import cbf
+    return cbf
+
+
+def _dense_reference(cbf, attributes):
+    """Cosine similarity against the dense feature matrix, min-max normalized."""
+    features = np.hstack([cbf.features_csr.toarray(), cbf.numeric_features])
+    label_query, numeric_query, _ = cbf.query_encoder.encode(attributes)
+    query = np.concatenate([label_query, numeric_query])
+    scores = features @ query / (np.linalg.norm(features, axis=1) * np.linalg.norm(query))
+    return (scores - scores.min()) / (scores.max() - scores.min())
+
+
+def test_feature_rows_are_unit_norm(cbf):
+    norms = np.sqrt(
+        np.asarray(cbf.features_csr.multiply(cbf.features_csr).sum(axis=1)).ravel()
+        + (np.asarray(cbf.numeric_features) ** 2).sum(axis=1)
+    )
+    np.testing.assert_allclose(norms[norms > 0], 1, atol=1e-5)
+
+
+def test_scores_match_dense_cosine(cbf):
+    np.testing.assert_allclose(cbf.get_cbf_scores(SAMPLE_ATTRIBUTES), _dense_reference(cbf, SAMPLE_ATTRIBUTES), atol=1e-5)
+
+
+def test_default_query_scores_are_normalized(cbf):
+    scores = cbf.get_cbf_scores({})
+    assert scores.shape == (cbf.n_games,)
+    assert 0 <= scores.min() and scores.max() <= 1
+
+
+def test_batch_matches_single_queries(cbf):
+    profiles = [SAMPLE_ATTRIBUTES, {}, {"game_mechanics": ["Dice Rolling"], "players": [2]}]
+    scores = cbf.get_cbf_scores_batch(profiles, block_size=2)
+    assert scores.shape == (3, cbf.n_games) and scores.dtype == np.float32
+    for row, attributes in zip(scores, profiles):
+        np.testing.assert_allclose(row, cbf.get_cbf_scores(attributes), atol=1e-5)
+
+    rows, top_scores = cbf.get_cbf_scores_batch(profiles, top_k=20)
+    assert rows.shape == top_scores.shape == (3, 20)
+    assert (np.diff(top_scores, axis=1) <= 0).all()
+    np.testing.assert_allclose(top_scores, np.sort(scores, axis=1)[:, ::-1][:, :20], atol=1e-6)
+    np.testing.assert_allclose(np.take_along_axis(scores, rows, axis=1), top_scores)
+
+
+def test_batch_of_no_queries(cbf):
+    assert cbf.get_cbf_scores_batch([]).shape == (0, cbf.n_games)
+    rows, scores = cbf.get_cbf_scores_batch([], top_k=5)
+    assert rows.shape == scores.shape == (0, 5)
+
+
+def test_query_encoder_canonicalizes_and_caches(cbf):
+    encoder = cbf.QueryEncoder(cbf._cbf_bundle.vocabularies, cbf._cbf_bundle.scaler_min, cbf._cbf_bundle.scaler_scale)
+    reordered = dict(SAMPLE_ATTRIBUTES, game_categories=[" Animals / Nature", "Abstract / Strategy", "Animals / Nature"])
+    assert encoder.canonical_key(reordered) == encoder.canonical_key(SAMPLE_ATTRIBUTES)
+
+    first = encoder.encode(SAMPLE_ATTRIBUTES)
+    second = encoder.encode(reordered)
+    assert all(a is b for a, b in zip(first, second))
+    assert encoder.cache_info().hits == 1 and encoder.cache_info().misses == 1
+    assert not first[0].flags.writeable
+
+    with_unknown = dict(SAMPLE_ATTRIBUTES, game_mechanics=["Team Play", "Not A Mechanic"])
+    np.testing.assert_array_equal(encoder.encode(with_unknown)[0], first[0])
+
+
+def test_query_encoder_numeric_defaults(cbf):
+    encoder = cbf.query_encoder
+    assert encoder.canonical_key({})[1] == (2.5, 3.0, 90.0)
+    assert encoder.canonical_key({"players": [2, 4], "game_weight": 3})[1] == (3.0, 3.0, 90.0)
+
+
+def test_candidate_scores_equal_full_scores_renormalized(cbf, rng):
+    # raw cosines of the full catalog, renormalized over the candidates only
+    raw = cbf.get_cbf_scores_batch([SAMPLE_ATTRIBUTES], normalize=False)[0].astype(np.float64)
+    candidates = np.sort(rng.choice(cbf.n_games, size=500, replace=False))
+    expected = np.zeros(cbf.n_games)
+    expected[candidates] = (raw[candidates] - raw[candidates].min()) / np.ptp(raw[candidates])
+
+    np.testing.assert_allclose(cbf.get_cbf_scores(SAMPLE_ATTRIBUTES, candidates=candidates), expected, atol=1e-5)
+    assert not cbf.get_cbf_scores(SAMPLE_ATTRIBUTES, candidates=[]).any()
+
+
+def test_constant_candidate_scores_rank_first(cbf):
+    full = cbf.get_cbf_scores(SAMPLE_ATTRIBUTES)
+    values, counts = np.unique(full, return_counts=True)
+    tied = np.flatnonzero(full == values[np.argmax(counts)])
+    assert len(tied) > 1
+
+    # a single candidate, or candidates that all tie, are all top matches rather than no matches
+    for candidates in (tied[:1], tied):
+        scores = cbf.get_cbf_scores(SAMPLE_ATTRIBUTES, candidates=candidates)
+        assert np.array_equal(np.flatnonzero(scores), candidates)
+        assert np.all(scores[candidates] == 1)
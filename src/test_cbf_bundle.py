@@ -0,0 +1,83 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+import cbf_bundle
+
+
+def _write_bundle(bundle_dir, rng, fingerprints=True):
+    n_games = 25
+    features = sparse_random(n_games, 7, density=0.3, format="csr", dtype=np.float32, random_state=rng)
+    vocabularies = {
+        "game_categories": ["Fantasy", "Wargame", "Économie"],
+        "game_mechanics": ["Dice Rolling", "Trading"],
+        "game_types": ["Thematic", "Family"],
+    }
+    arrays = dict(
+        bgg_ids=np.arange(1, n_games + 1) * 3,
+        features_csr=features,
+        numeric_features=rng.random((n_games, 3)),
+        scaler_min=np.array([0.1, 0.2, 0.3]),
+        scaler_scale=np.array([1.0, 2.0, 3.0]),
+        vocabularies=vocabularies,
+        fingerprints=rng.integers(0, 2**63, n_games, dtype=np.uint64) if fingerprints else None,
+    )
+    cbf_bundle.save_cbf_bundle(str(bundle_dir), **arrays)
+    return arrays
+
+
+def test_bundle_roundtrip(tmp_path, rng):
+    bundle_dir = tmp_path / "precomputed_CBF"
+    arrays = _write_bundle(bundle_dir, rng)
+    bundle = cbf_bundle.load_cbf_bundle(str(bundle_dir), verify=True)
+
+    assert bundle.n_games == 25
+    assert isinstance(bundle.bgg_ids, np.memmap)
+    np.testing.assert_array_equal(bundle.bgg_ids, arrays["bgg_ids"])
+    np.testing.assert_allclose(bundle.features_csr.toarray(), arrays["features_csr"].toarray())
+    np.testing.assert_allclose(bundle.numeric_features, arrays["numeric_features"], rtol=1e-6)
+    np.testing.assert_allclose(bundle.scaler_scale, arrays["scaler_scale"])
+    np.testing.assert_array_equal(bundle.fingerprints, arrays["fingerprints"])
+    assert bundle.vocabularies == arrays["vocabularies"]
+    assert bundle.manifest["format_version"] == cbf_bundle.FORMAT_VERSION
+
+
+def test_bundle_without_fingerprints(tmp_path, rng):
+    _write_bundle(tmp_path / "bundle", rng, fingerprints=False)
+    assert cbf_bundle.load_cbf_bundle(str(tmp_path / "bundle")).fingerprints is None
+
+
+def test_save_replaces_previous_bundle(tmp_path, rng):
+    bundle_dir = tmp_path / "bundle"
+    _write_bundle(bundle_dir, rng)
+    arrays = _write_bundle(bundle_dir, rng, fingerprints=False)
+
+    assert sorted(os.listdir(tmp_path)) == ["bundle"]
+    bundle = cbf_bundle.load_cbf_bundle(str(bundle_dir), verify=True)
+    np.testing.assert_allclose(bundle.numeric_features, arrays["numeric_features"], rtol=1e-6)
+    assert bundle.fingerprints is None
+
+
+def test_verify_detects_modified_files(tmp_path, rng):
+    bundle_dir = tmp_path / "bundle"
+    _write_bundle(bundle_dir, rng)
+    np.save(bundle_dir / "numeric_features.npy", np.zeros((25, 3), dtype=np.float32))
+
+    cbf_bundle.load_cbf_bundle(str(bundle_dir))
+    with pytest.raises(ValueError, match="checksum mismatch for numeric_features.npy"):
+        cbf_bundle.load_cbf_bundle(str(bundle_dir), verify=True)
+
+
+def test_other_bundle_formats_are_rejected(tmp_path, rng):
+    bundle_dir = tmp_path / "bundle"
+    _write_bundle(bundle_dir, rng)
+    manifest_path = bundle_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest["format_version"] = cbf_bundle.FORMAT_VERSION - 1
+    manifest_path.write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError, match="rebuild it"):
+        cbf_bundle.load_cbf_bundle(str(bundle_dir))
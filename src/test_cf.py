@@ -0,0 +1,197 @@
+import os
+
+import numpy as np
+
+import cf
+from conftest import write_cf_model
+
+
+def _build_store(tmp_path):
+    V, bgg_ids = write_cf_model(str(tmp_path))
+    store = cf.load_cf_store(
+        store_dir=str(tmp_path / "cf_store"),
+        npz_path=str(tmp_path / "V_final_quantized.npz"),
+        games_path=str(tmp_path / "games.csv"),
+    )
+    return store, V, bgg_ids
+
+
+def test_store_rows_are_sorted_by_bgg_id_and_memory_mapped(tmp_path):
+    store, V, bgg_ids = _build_store(tmp_path)
+
+    order = np.argsort(bgg_ids)
+    assert np.array_equal(store.bgg_ids, bgg_ids[order])
+    assert isinstance(store.V, np.memmap)
+    np.testing.assert_allclose(store.V, V[order], rtol=1e-6)
+    assert np.array_equal(store.rows_for([bgg_ids[5], -1, bgg_ids[7]]), [order.argsort()[5], order.argsort()[7]])
+
+
+def test_store_is_rebuilt_when_the_npz_is_newer(tmp_path):
+    store, _, _ = _build_store(tmp_path)
+    npz_path = str(tmp_path / "V_final_quantized.npz")
+    V_path = str(tmp_path / "cf_store" / "V.npy")
+    assert not cf._store_is_stale(str(tmp_path / "cf_store"), npz_path)
+
+    # pretend the store was built before the npz was last written
+    stamp = os.path.getmtime(npz_path) - 10
+    os.utime(V_path, (stamp, stamp))
+    assert cf._store_is_stale(str(tmp_path / "cf_store"), npz_path)
+
+    cf.load_cf_store(store_dir=str(tmp_path / "cf_store"), npz_path=npz_path, games_path=str(tmp_path / "games.csv"))
+    assert not cf._store_is_stale(str(tmp_path / "cf_store"), npz_path)
+
+
+def test_quantized_dot_and_gather_match_float32(rng):
+    V = rng.standard_normal((1000, 32)).astype(np.float32)
+    Vq = cf.QuantizedEmbeddings.quantize(V, block_size=128)
+    u = rng.standard_normal(32).astype(np.float32)
+    U = rng.standard_normal((32, 5)).astype(np.float32)
+
+    # per-row int8 keeps every entry within half a quantization step of the row max
+    assert np.all(np.abs(Vq[np.arange(1000)] - V) <= np.abs(V).max(axis=1, keepdims=True) / 254 + 1e-6)
+    np.testing.assert_allclose(Vq.dot(u), V @ u, atol=0.05 * np.abs(V @ u).max())
+    np.testing.assert_allclose(Vq.dot(U), V @ U, atol=0.05 * np.abs(V @ U).max())
+    assert Vq.nbytes < V.nbytes / 3
+
+
+def test_quantization_report_uses_the_given_store(rng, monkeypatch):
+    V = rng.standard_normal((400, 16)).astype(np.float32)
+    store = cf.CFModelStore(V, np.arange(400) * 3 + 1, V_quantized=cf.QuantizedEmbeddings.quantize(V))
+
+    def no_shared_store():
+        raise AssertionError("the shared store must not be used")
+
+    monkeypatch.setattr(cf, "get_cf_store", no_shared_store)
+    report = cf.quantization_report(n_users=20, store=store)
+    assert report["max_abs_error"] < 0.05
+    assert report["top10_overlap"] > 0.8
+
+
+def test_batched_fold_in_matches_per_user_fold_in(rng):
+    V = (rng.standard_normal((500, 16)) * 0.3).astype(np.float32)
+    # few likes (small dual system) and more likes than factors (k x k normal equations)
+    liked = [rng.choice(500, size=n, replace=False) for n in [1, 3, 5, 8, 15, 16, 20, 40] * 5]
+    liked.append(np.array([], dtype=int))
+
+    U = cf.fold_in_implicit_users(V, liked, alpha=5, lambda_=0.3, batch_size=7)
+    for u, items in zip(U, liked):
+        expected = cf.fold_in_implicit_user(V.astype(np.float64), items, alpha=5, lambda_=0.3)
+        if len(items) == 0:
+            assert not u.any()
+        else:
+            assert np.linalg.norm(u - expected) <= 2e-3 * np.linalg.norm(expected)
+
+
+def test_score_blocks_are_normalized_rows_of_u_v(rng):
+    V = rng.standard_normal((50, 8)).astype(np.float32)
+    U = rng.standard_normal((7, 8)).astype(np.float32)
+    U[3] = 0
+    blocks = list(cf.iter_cf_score_blocks(U, V, block_size=3))
+    scores = np.vstack([block for _, block in blocks])
+
+    assert [start for start, _ in blocks] == [0, 3, 6]
+    raw = U @ V.T
+    expected = (raw - raw.min(axis=1, keepdims=True)) / np.ptp(raw, axis=1, keepdims=True).clip(1e-30)
+    expected[3] = 0
+    np.testing.assert_allclose(scores, expected, atol=1e-5)
+
+
+def test_fold_in_state_tracks_adds_and_removes_across_refactors(rng):
+    V = (rng.standard_normal((300, 16)) * 0.3).astype(np.float32)
+    state = cf.FoldInState(V, alpha=5, lambda_=0.3, refactor_every=5)
+    liked = set()
+    for _ in range(60):
+        if liked and rng.random() < 0.4:
+            row = int(rng.choice(sorted(liked)))
+            liked.discard(row)
+            state.remove(row)
+        else:
+            row = int(rng.integers(300))
+            liked.add(row)
+            state.add(row)
+
+        assert state.liked_rows == liked
+        if liked:
+            expected = cf.fold_in_implicit_user(V.astype(np.float64), sorted(liked), alpha=5, lambda_=0.3)
+            assert np.linalg.norm(state.user_vector - expected) <= 3e-3 * np.linalg.norm(expected)
+
+def _renormalized(scores, candidates):
+    expected = np.zeros_like(scores)
+    subset = scores[candidates]
+    expected[candidates] = (subset - subset.min()) / (subset.max() - subset.min())
+    return expected
+
+
+def test_candidate_scores_equal_full_scores_renormalized(rng):
+    V = rng.standard_normal((500, 16)).astype(np.float32)
+    store = cf.CFModelStore(V, np.arange(500) * 2 + 1, V_quantized=cf.QuantizedEmbeddings.quantize(V))
+    liked = store.bgg_ids[[3, 40, 41, 250]]
+    candidates = np.sort(rng.choice(500, size=120, replace=False))
+
+    for quantized in (True, False):
+        full = cf.get_cf_scores(liked, quantized=quantized, store=store)
+        pruned = cf.get_cf_scores(liked, quantized=quantized, store=store, candidates=candidates)
+        np.testing.assert_allclose(pruned, _renormalized(full, candidates), atol=1e-5)
+
+    assert not cf.get_cf_scores(liked, store=store, candidates=[]).any()
+
+
+def test_constant_candidate_scores_rank_first(rng):
+    V = rng.standard_normal((100, 8)).astype(np.float32)
+    V[60] = V[40]
+    store = cf.CFModelStore(V, np.arange(100) * 2 + 1, V_quantized=cf.QuantizedEmbeddings.quantize(V))
+    liked = store.bgg_ids[[3, 7]]
+
+    # a single candidate, or candidates that all tie, are all top matches rather than no matches
+    for candidates in ([40], [40, 60]):
+        scores = cf.get_cf_scores(liked, quantized=False, store=store, candidates=candidates)
+        assert np.array_equal(np.flatnonzero(scores), candidates)
+        assert np.all(scores[candidates] == 1)
+
+
+def test_fold_in_state_is_consistent_across_threads(rng):
+    from concurrent.futures import ThreadPoolExecutor
+
+    V = (rng.standard_normal((300, 16)) * 0.3).astype(np.float32)
+    state = cf.FoldInState(V, alpha=5, lambda_=0.3, refactor_every=3)
+    liked_sets = [sorted(rng.choice(300, size=rng.integers(1, 8), replace=False).tolist()) for _ in range(200)]
+
+    def fold_in(liked):
+        return liked, state.fold_in(liked)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(fold_in, liked_sets))
+
+    # every returned vector is the fold-in of the rows that call asked for
+    for liked, u in results:
+        expected = cf.fold_in_implicit_user(V.astype(np.float64), liked, alpha=5, lambda_=0.3)
+        assert np.linalg.norm(u - expected) <= 3e-3 * np.linalg.norm(expected)
+
+
+def test_fold_in_state_sync_matches_a_fresh_state(rng):
+    V = (rng.standard_normal((200, 8)) * 0.3).astype(np.float32)
+    state = cf.FoldInState(V)
+    state.sync([1, 2, 3, 4])
+    u = state.fold_in([3, 4, 5])
+
+    fresh = cf.FoldInState(V)
+    np.testing.assert_allclose(u, fresh.fold_in([3, 4, 5]), rtol=1e-6, atol=1e-9)
+    assert state.liked_rows == {3, 4, 5}
+
+
+def test_store_without_a_current_manifest_is_rebuilt(tmp_path):
+    store, _, _ = _build_store(tmp_path)
+    store_dir = str(tmp_path / "cf_store")
+    npz_path = str(tmp_path / "V_final_quantized.npz")
+    assert store.manifest["format_version"] == cf.CF_STORE_FORMAT
+    assert store.manifest["row_order"] == "bgg_id"
+
+    manifest_path = tmp_path / "cf_store" / "manifest.json"
+    manifest_path.write_text('{"format_version": 1}')
+    assert cf._store_is_stale(store_dir, npz_path)
+    os.remove(manifest_path)
+    assert cf._store_is_stale(store_dir, npz_path)
+
+    rebuilt = cf.load_cf_store(store_dir=store_dir, npz_path=npz_path, games_path=str(tmp_path / "games.csv"))
+    assert rebuilt.manifest["format_version"] == cf.CF_STORE_FORMAT
+    assert not cf._store_is_stale(store_dir, npz_path)
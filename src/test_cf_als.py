@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse import random as sparse_random
+
+import cf_als
+
+
+def _random_confidence(rng, n_users=60, n_items=40, density=0.15):
+    R = sparse_random(n_users, n_items, density=density, format="csr", random_state=rng)
+    R.data = rng.integers(1, 11, size=R.nnz).astype(np.float32)
+    return cf_als.build_confidence_matrix(R, alpha=20)
+
+
+def _exact_half_step(C, Y, lambda_):
+    C = C.toarray()
+    X = np.empty((C.shape[0], Y.shape[1]))
+    for u, c in enumerate(C):
+        observed = c > 0
+        conf = np.where(observed, c, 1.0)
+        A = Y.T @ (conf[:, None] * Y) + lambda_ * np.eye(Y.shape[1])
+        X[u] = np.linalg.solve(A, Y.T @ (conf * observed))
+    return X
+
+
+def test_half_step_converges_to_the_exact_solve(rng):
+    C = _random_confidence(rng)
+    Y = rng.standard_normal((C.shape[1], 8)).astype(np.float64)
+    X = np.zeros((C.shape[0], 8))
+
+    cf_als.als_half_step(C, X, Y, lambda_=0.1, cg_steps=30, max_block_nnz=50)
+    np.testing.assert_allclose(X, _exact_half_step(C, Y, 0.1), rtol=1e-5, atol=1e-6)
+
+
+def test_row_blocks_cover_every_row_once(rng):
+    C = _random_confidence(rng, n_users=200)
+    blocks = cf_als._row_blocks(C.indptr, 37)
+    assert blocks[0][0] == 0 and blocks[-1][1] == C.shape[0]
+    assert all(stop == start for (_, stop), (start, _) in zip(blocks, blocks[1:]))
+    assert all(start < stop for start, stop in blocks)
+
+
+def test_load_ratings_matrix_follows_item_ids_and_drops_sparse_users(tmp_path):
+    ratings = pd.DataFrame({
+        "Username": ["bob"] * 3 + ["alice"] * 3 + ["carol"] * 1,
+        "BGGId": [30, 10, 99, 10, 20, 30, 20],
+        "Rating": [7.0, 8.0, 5.0, 6.0, 9.0, 4.0, 10.0],
+    })
+    path = tmp_path / "user_ratings.csv"
+    ratings.to_csv(path, index=False)
+
+    R, usernames, item_ids = cf_als.load_ratings_matrix(path, item_ids=[30, 20, 10], min_user_ratings=2, chunksize=4)
+    assert list(usernames) == ["alice", "bob"]
+    assert list(item_ids) == [30, 20, 10]
+    np.testing.assert_array_equal(R.toarray(), [[4, 9, 6], [7, 0, 8]])
+
+    R, _, item_ids = cf_als.load_ratings_matrix(path, min_user_ratings=1)
+    assert list(item_ids) == [10, 20, 30, 99]
+    assert R.shape == (3, 4)
+
+
+def test_confidence_matrix_scales_ratings(rng):
+    R = sparse_random(5, 6, density=0.5, format="csr", random_state=rng)
+    R.data = rng.integers(1, 11, size=R.nnz).astype(np.float32)
+    C = cf_als.build_confidence_matrix(R, alpha=20)
+    np.testing.assert_allclose(C.data, 1 + 20 * (R.data - 1) / 9)
+
+
+def test_bm25_weight_matches_the_formula():
+    X = np.array([[1.0, 0, 2], [0, 3, 0], [1, 1, 0]])
+    weighted = cf_als.bm25_weight(X, K1=1.2, B=0.75).toarray()
+
+    idf = np.log(3) - np.log1p((X > 0).sum(axis=0))
+    length_norm = 0.25 + 0.75 * X.sum(axis=1) / X.sum(axis=1).mean()
+    expected = np.where(X > 0, X * 2.2 / (1.2 * length_norm[:, None] + X) * idf, 0)
+    np.testing.assert_allclose(weighted, expected, rtol=1e-6)
+
+
+def test_train_implicit_als_shapes(rng):
+    C = _random_confidence(rng)
+    U, V, timings = cf_als.train_implicit_als(C, factors=8, iterations=3, n_workers=2, verbose=False)
+    assert U.shape == (C.shape[0], 8) and V.shape == (C.shape[1], 8)
+    assert len(timings) == 3
+    assert np.isfinite(U).all() and np.isfinite(V).all()
+
+
+def test_incremental_update_only_moves_touched_items(rng):
+    V = (rng.standard_normal((50, 8)) * 0.3).astype(np.float32)
+    R_delta = sparse_random(20, 50, density=0.05, format="csr", random_state=rng)
+    R_delta.data = rng.integers(6, 11, size=R_delta.nnz).astype(np.float32)
+
+    V_new, touched, U_delta = cf_als.incremental_update(V, R_delta)
+    untouched = np.setdiff1d(np.arange(50), touched)
+    np.testing.assert_array_equal(V_new[untouched], V[untouched])
+    np.testing.assert_array_equal(touched, np.unique(R_delta.indices))
+    assert not np.allclose(V_new[touched], V[touched])
+    assert U_delta.shape == (20, 8)
+
+
+def test_quantized_roundtrip_and_latest_version(tmp_path, rng):
+    V = rng.standard_normal((30, 4)).astype(np.float32)
+    assert cf_als.latest_version_path(tmp_path / "missing") is None
+    assert cf_als.latest_version_path(tmp_path) is None
+
+    cf_als.save_quantized(V, tmp_path / "V_final_quantized.npz")
+    for version in (2, 10, 9):
+        cf_als.save_quantized(V, tmp_path / f"V_final_quantized_v{version:04d}.npz", version=version)
+
+    V_loaded, version = cf_als.load_quantized(tmp_path / "V_final_quantized.npz")
+    assert version == 0
+    np.testing.assert_allclose(V_loaded, V, atol=np.abs(V).max() / 127)
+
+    latest = cf_als.latest_version_path(tmp_path)
+    assert latest.endswith("V_final_quantized_v0010.npz")
+    assert cf_als.load_quantized(latest)[1] == 10
+
+
+def _trained_model(rng, n_users=600, n_items=80, k=8):
+    U_true = rng.standard_normal((n_users, k))
+    V_true = rng.standard_normal((n_items, k))
+    affinity = U_true @ V_true.T
+    rated = rng.random((n_users, n_items)) < 1 / (1 + np.exp(2 - affinity))
+    ratings = np.clip(np.rint(5.5 + affinity / 2), 1, 10)
+    R = csr_matrix(np.where(rated, ratings, 0).astype(np.float32))
+    C = cf_als.build_confidence_matrix(cf_als.bm25_weight(R), alpha=160, gamma=3.0)
+    U, V, _ = cf_als.train_implicit_als(C, factors=k, iterations=10, n_workers=1, verbose=False)
+    return R, U, V
+
+
+def test_bm25_weight_with_training_stats_matches_weighting_the_whole_matrix(rng):
+    R, _, _ = _trained_model(rng)
+    stats = cf_als.bm25_stats(R)
+    # the stats make a slice of rows weigh exactly as they did inside the full matrix
+    np.testing.assert_allclose(
+        cf_als.bm25_weight(R[:25], stats=stats).toarray(), cf_als.bm25_weight(R).toarray()[:25], rtol=1e-5
+    )
+
+
+def test_neutral_or_empty_delta_leaves_v_nearly_unchanged(rng, tmp_path):
+    R, U, V = _trained_model(rng)
+    path = tmp_path / "V_final_quantized.npz"
+    cf_als.save_quantized(V, path, train_stats=cf_als.training_stats(R, U))
+    train_stats = cf_als.load_train_stats(path)
+    assert train_stats["user_gram"].shape == (8, 8)
+    cf_als.save_quantized(V, tmp_path / "untrained.npz")
+    assert cf_als.load_train_stats(tmp_path / "untrained.npz") is None
+
+    V_new, touched, _ = cf_als.incremental_update(V, csr_matrix((0, V.shape[0]), dtype=np.float32),
+                                                  train_stats=train_stats)
+    assert len(touched) == 0
+    np.testing.assert_array_equal(V_new, V)
+
+    # users re-sending ratings the model was trained on carry no new information
+    V_new, touched, _ = cf_als.incremental_update(V, R[:10], train_stats=train_stats)
+    change = np.linalg.norm(V_new[touched] - V[touched], axis=1) / np.linalg.norm(V[touched], axis=1)
+    assert len(touched) > 40
+    assert np.median(change) < 0.05 and change.max() < 0.1
+
+
+def test_delta_evidence_moves_items_together(rng):
+    R, U, V = _trained_model(rng)
+    train_stats = cf_als.training_stats(R, U)
+    a, b = 0, int(np.argmin(V @ V[0]))
+
+    def cosine(V):
+        return V[a] @ V[b] / np.linalg.norm(V[a]) / np.linalg.norm(V[b])
+
+    # many new users who love both games pull them together, a few barely do
+    cosines = []
+    for n_users in (3, 300):
+        R_delta = csr_matrix(
+            (np.full(2 * n_users, 10.0, dtype=np.float32), (np.repeat(np.arange(n_users), 2), np.tile([a, b], n_users))),
+            shape=(n_users, V.shape[0]),
+        )
+        cosines.append(cosine(cf_als.incremental_update(V, R_delta, train_stats=train_stats)[0]))
+    assert cosine(V) < 0 and abs(cosines[0] - cosine(V)) < 0.1 and cosines[1] > 0.3
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+import cf
+import cf_index
+from cf_index import IVFIndex
+
+
+def _clustered_embeddings(rng, n_items=2000, k=16, n_clusters=40):
+    centers = rng.standard_normal((n_clusters, k))
+    V = centers[rng.integers(n_clusters, size=n_items)] + 0.5 * rng.standard_normal((n_items, k))
+    return V.astype(np.float32)
+
+
+def test_probing_every_list_is_exact_search(rng):
+    V = _clustered_embeddings(rng)
+    index = IVFIndex.build(V, items_per_list=25)
+    assert index.n_lists == 80
+    assert np.array_equal(np.sort(index.candidates(rng.standard_normal(16), n_probe=index.n_lists)), np.arange(2000))
+
+    for _ in range(10):
+        u = rng.standard_normal(16).astype(np.float32)
+        rows, scores = index.search(u, top_n=30, n_probe=index.n_lists)
+        exact = V @ u
+        expected = np.lexsort((np.arange(2000), -exact))[:30]
+        assert np.array_equal(rows, expected)
+        np.testing.assert_allclose(scores, exact[expected], rtol=1e-5)
+
+
+def test_recall_grows_with_n_probe(rng):
+    V = _clustered_embeddings(rng)
+    store = cf.CFModelStore(V, np.arange(2000) * 3 + 1, V_quantized=cf.QuantizedEmbeddings.quantize(V))
+    index = IVFIndex.build(V, items_per_list=25)
+
+    report = cf_index.recall_report(index=index, store=store, n_queries=30, top_n=20, n_probes=[4, 20, 40, 80])
+    recalls = [row["recall@20"] for row in report]
+    scanned = [row["scanned_fraction"] for row in report]
+    assert recalls == sorted(recalls) and recalls[-1] == 1.0
+    assert scanned == sorted(scanned) and scanned[-1] == 1.0
+    # a quarter of the lists finds most of the exact top 20
+    assert recalls[1] > 0.7
+
+
+def test_saved_index_round_trips_and_goes_stale_with_the_store(rng, tmp_path):
+    V = _clustered_embeddings(rng)
+    index_dir = str(tmp_path)
+    np.save(os.path.join(index_dir, "V.npy"), V)
+    assert cf_index._index_is_stale(index_dir)
+
+    index = IVFIndex.build(V)
+    index.save(index_dir)
+    assert not cf_index._index_is_stale(index_dir)
+    loaded = IVFIndex.load(index_dir)
+    u = rng.standard_normal(16).astype(np.float32)
+    for a, b in zip(index.search(u, top_n=10, n_probe=5), loaded.search(u, top_n=10, n_probe=5)):
+        assert np.array_equal(a, b)
+
+    # a store rebuilt after the index makes it stale
+    stamp = os.path.getmtime(os.path.join(index_dir, "ivf_centroids.npy")) + 10
+    os.utime(os.path.join(index_dir, "V.npy"), (stamp, stamp))
+    assert cf_index._index_is_stale(index_dir)
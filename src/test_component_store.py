@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from component_store import ComponentStore
+
+
+def test_entries_are_kept_per_component_and_read_only():
+    store = ComponentStore()
+    store.set("cf", (1, 2), np.arange(3.0))
+    assert store.get("cbf", (1, 2)) is None
+    scores = store.get("cf", (1, 2))
+    np.testing.assert_array_equal(scores, [0, 1, 2])
+    with pytest.raises(ValueError):
+        scores[0] = 5
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted():
+    store = ComponentStore(max_entries=2)
+    store.set("llm", "a", np.zeros(2))
+    store.set("llm", "b", np.ones(2))
+    store.get("llm", "a")
+    store.set("llm", "c", np.ones(2))
+    assert store.get("llm", "b") is None
+    assert store.get("llm", "a") is not None and store.get("llm", "c") is not None
+
+    store.clear()
+    assert store.get("llm", "a") is None
+
+
+def test_scored_rows_limit_reuse_to_sub_pools():
+    store = ComponentStore()
+    store.set("llm", "co-op", np.arange(6.0), scored_rows=[1, 3, 4])
+    assert store.get("llm", "co-op", rows=[3, 1]) is not None
+    assert store.get("llm", "co-op", rows=[]) is not None
+    assert store.get("llm", "co-op", rows=[1, 2]) is None
+    assert store.get("llm", "co-op") is not None
+    assert (store.hits, store.misses) == (3, 1)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from filters import NUMERIC_COLUMNS, FilterEngine
+
+ATTRIBUTE_CASES = [
+    {},
+    {"game_categories": ["fantasy", " Wargame"]},
+    {"game_categories": ["", "  "], "game_mechanics": ["Dice Rolling"]},
+    {"game_types": ["Thematic"], "players": [2, 3], "play_time": [30, 60]},
+    {"game_weight": [2.37, 3.3], "year_published": [2000, 2015]},
+    {"min_rating": [7.1], "players": [5]},
+    {"game_categories": ["Party"], "game_weight": (2.0, 4.0), "min_rating": [6.0], "play_time": [45, 45]},
+]
+
+
+def _games(rng, n_games=400):
+    categories = ["Fantasy", "Wargame", "Economic", "Party"]
+    games_df = pd.DataFrame({
+        "game_categories": [list(rng.choice(categories, size=rng.integers(3), replace=False)) for _ in range(n_games)],
+        "game_mechanics": [["Dice Rolling"] if i % 3 == 0 else [] for i in range(n_games)],
+        "game_types": [["Thematic"] if i % 2 else ["Family"] for i in range(n_games)],
+        "game_weight": np.where(rng.random(n_games) < 0.05, np.nan, rng.uniform(1, 5, n_games).round(2)),
+        "year_published": rng.integers(1990, 2025, n_games).astype(float),
+        "avg_rating": rng.uniform(4, 9, n_games).round(3),
+        "players_min": rng.integers(1, 3, n_games),
+        "players_max": rng.integers(2, 8, n_games),
+        "time_min": rng.integers(10, 60, n_games),
+        "time_max": rng.integers(45, 240, n_games),
+    })
+    # values equal to the bounds used below, which are not exact in float32
+    games_df.loc[0, "game_weight"] = 2.37
+    games_df.loc[1, "avg_rating"] = 7.1
+    return games_df
+
+
+def _pandas_mask(games_df, attributes):
+    """The filters of the original ensemble_scores, on a DataFrame."""
+    mask = pd.Series(True, index=games_df.index)
+    for attr_name in ["game_categories", "game_mechanics", "game_types"]:
+        selected = attributes.get(attr_name, [])
+        if selected and any(isinstance(s, str) and s.strip() for s in selected):
+            selected_clean = [s.strip().lower() for s in selected if isinstance(s, str) and s.strip()]
+            mask &= games_df[attr_name].apply(lambda ga: any(a.strip().lower() in selected_clean for a in ga))
+    for attr_name, (min_column, max_column) in {
+        "game_weight": ("game_weight", "game_weight"),
+        "year_published": ("year_published", "year_published"),
+        "players": ("players_min", "players_max"),
+        "play_time": ("time_min", "time_max"),
+    }.items():
+        value_range = attributes.get(attr_name)
+        if isinstance(value_range, (list, tuple)) and len(value_range) == 2:
+            lo, hi = value_range
+            mask &= (games_df[max_column] >= lo) & (games_df[min_column] <= hi)
+    min_rating = attributes.get("min_rating")
+    if isinstance(min_rating, (list, tuple)) and len(min_rating) > 0:
+        mask &= games_df["avg_rating"] >= min_rating[0]
+    return mask.to_numpy()
+
+
+@pytest.mark.parametrize("attributes", ATTRIBUTE_CASES)
+def test_mask_matches_the_pandas_filters(rng, attributes):
+    games_df = _games(rng)
+    engine = FilterEngine(games_df)
+    np.testing.assert_array_equal(engine.mask(attributes), _pandas_mask(games_df, attributes))
+    np.testing.assert_array_equal(engine.candidates(attributes), np.flatnonzero(_pandas_mask(games_df, attributes)))
+
+
+@pytest.mark.parametrize("attributes", ATTRIBUTE_CASES)
+def test_float32_columns_filter_like_float64(rng, attributes):
+    games_df = _games(rng)
+    reference = FilterEngine(games_df)
+    columns = {
+        column: games_df[column].to_numpy(dtype=np.float32 if games_df[column].dtype.kind == "f" else np.int16)
+        for column in NUMERIC_COLUMNS
+    }
+    compact = FilterEngine.from_columns(len(games_df), columns, reference.label_indexes)
+    np.testing.assert_array_equal(compact.mask(attributes), reference.mask(attributes))
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from id_index import IdIndex
+
+
+@pytest.mark.parametrize("ids", [[3, 10, 42, 99], [42, 3, 99, 10]])
+def test_lookup_returns_rows_and_minus_one_for_unknown_ids(ids):
+    index = IdIndex(ids)
+    assert index.is_sorted == (ids == sorted(ids))
+    np.testing.assert_array_equal(index.lookup([99, 4, 3, 1000, 0]), [ids.index(99), -1, ids.index(3), -1, -1])
+    np.testing.assert_array_equal(index.rows_for([10, 11, 42]), [ids.index(10), ids.index(42)])
+    np.testing.assert_array_equal(index.contains([42, 43]), [True, False])
+    assert len(index) == 4
+
+
+def test_lookup_matches_a_dict(rng):
+    ids = rng.choice(500_000, size=5000, replace=False)
+    index = IdIndex(ids)
+    row_of = {gid: row for row, gid in enumerate(ids)}
+    queries = rng.integers(0, 500_000, size=2000)
+    np.testing.assert_array_equal(index.lookup(queries), [row_of.get(q, -1) for q in queries])
+
+
+def test_empty_index_and_empty_queries():
+    assert IdIndex([]).lookup([1, 2]).tolist() == [-1, -1]
+    assert IdIndex([5, 6]).lookup(None).tolist() == []
+
+
+def test_invalid_ids_raise():
+    with pytest.raises(ValueError, match="unique"):
+        IdIndex([5, 3, 5])
+    with pytest.raises(ValueError, match="int32"):
+        IdIndex([1, 2**31])
+
+
+def test_check_aligned_reports_the_first_mismatch():
+    index = IdIndex([1, 2, 3, 4])
+    index.check_aligned("CF store", [1, 2, 3, 4])
+    with pytest.raises(ValueError, match="has 3 rows but the catalog has 4 games"):
+        index.check_aligned("CF store", [1, 2, 3])
+    with pytest.raises(ValueError, match=r"2 rows differ, first at row 2 \(BGGId 4, catalog has 3\)"):
+        index.check_aligned("CBF bundle", [1, 2, 4, 3])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from label_index import LabelIndex, build_label_indexes
+
+LABELS = ["Fantasy", "Wargame", "Economic", "Party", "Dice"]
+
+
+def _random_values(rng, n_rows=203):
+    values = []
+    for _ in range(n_rows):
+        kind = rng.integers(5)
+        if kind == 0:
+            values.append(None)
+        elif kind == 1:
+            values.append(str(rng.choice(LABELS)))
+        else:
+            values.append([str(label) for label in rng.choice(LABELS, size=kind - 1, replace=False)])
+    return values
+
+
+def _naive_any_of(values, selected):
+    wanted = {s.strip().lower() for s in selected if isinstance(s, str) and s.strip()}
+    mask = []
+    for labels in values:
+        if isinstance(labels, str):
+            labels = [labels]
+        elif not isinstance(labels, list):
+            labels = []
+        mask.append(any(label.strip().lower() in wanted for label in labels))
+    return np.array(mask)
+
+
+def test_any_of_matches_a_naive_scan(rng):
+    values = _random_values(rng)
+    index = LabelIndex(values)
+    for selected in [["Fantasy"], [" fantasy ", "DICE"], ["Party", "Wargame", "Economic"], ["Unknown"], [], ["", None]]:
+        np.testing.assert_array_equal(index.any_of(selected), _naive_any_of(values, selected))
+
+
+def test_from_csr_matches_list_built_index(rng):
+    values = [labels if isinstance(labels, list) else [labels] if labels else [] for labels in _random_values(rng)]
+    vocabulary = sorted(LABELS)
+    offsets = np.r_[0, np.cumsum([len(labels) for labels in values])]
+    indices = np.array([vocabulary.index(label) for labels in values for label in labels], dtype=np.int64)
+
+    csr_index = LabelIndex.from_csr(offsets, indices, vocabulary)
+    list_index = LabelIndex(values)
+    assert csr_index.n_rows == len(values)
+    for selected in [["Fantasy"], ["economic", "Party"], LABELS]:
+        np.testing.assert_array_equal(csr_index.any_of(selected), list_index.any_of(selected))
+
+
+def test_build_label_indexes_skips_missing_columns():
+    df = pd.DataFrame({"game_categories": [["Fantasy"], []], "name": ["a", "b"]})
+    indexes = build_label_indexes(df)
+    assert list(indexes) == ["game_categories"]
+    np.testing.assert_array_equal(indexes["game_categories"].any_of(["fantasy"]), [True, False])
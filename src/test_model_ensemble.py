@@ -0,0 +1,374 @@
+import time
+
+import numpy as np
+import pytest
+
+from conftest import requires_data
+
+pytestmark = requires_data
+
+ATTRIBUTES = {
+    "game_categories": ["Fantasy", "Adventure"],
+    "players": [2, 4],
+    "play_time": [30, 120],
+    "game_weight": [1.5, 4.0],
+}
+LIKED = [13, 822, 30549, 68448]
+
+
+@pytest.fixture(scope="module")
+def ensemble():
+    import model_ensemble
+    return model_ensemble
+
+
+def _fake_llm_scores(user_description, attributes=None, top_k=200, candidate_mask=None, timeout=None):
+    """Stand-in for the OpenAI scorer: scores the games of the real prompt pool, seeded by the description."""
+    import model_ensemble
+
+    scores = np.zeros(model_ensemble.n_games)
+    if not user_description:
+        return scores
+    if candidate_mask is None:
+        candidate_mask = model_ensemble.filter_engine.mask(attributes)
+    rows = model_ensemble.llm_candidate_rows(candidate_mask, top_k)
+    # a game scores the same whichever other games share the prompt, extra whitespace aside
+    rng = np.random.default_rng(len(" ".join(user_description.split())))
+    scores[rows] = rng.random(len(scores)).round(2)[rows]
+    return scores
+
+
+@pytest.fixture(autouse=True)
+def fake_llm(ensemble, monkeypatch):
+    monkeypatch.setattr(ensemble, "get_llm_scores", _fake_llm_scores)
+
+
+def test_run_scorers_reports_ok_timeout_and_error(ensemble):
+    def fail():
+        raise RuntimeError("boom")
+
+    def slow():
+        time.sleep(0.5)
+        return "late"
+
+    scorers = {"ok": lambda: "fast", "slow": slow, "fail": fail}
+    results, status = ensemble.run_scorers(scorers, timeouts={"slow": 0.05})
+    assert results == {"ok": "fast", "slow": None, "fail": None}
+    assert status == {"ok": "ok", "slow": "timeout", "fail": "error"}
+
+    results, status = ensemble.run_scorers(scorers, timeouts={"slow": 0.05}, concurrent=False)
+    assert results == {"ok": "fast", "slow": "late", "fail": None}
+    assert status == {"ok": "ok", "slow": "ok", "fail": "error"}
+
+
+def test_concurrent_scoring_matches_sequential(ensemble):
+    kwargs = dict(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy", n_recommendations=10)
+    concurrent = ensemble.ensemble_scores(**kwargs)
+    sequential = ensemble.ensemble_scores(**kwargs, concurrent=False)
+    assert concurrent.equals(sequential)
+    assert concurrent.attrs["scorer_status"] == {"cf": "ok", "cbf": "ok", "llm": "ok"}
+
+
+def test_latency_budget_drops_a_slow_llm(ensemble, monkeypatch):
+    def slow_llm(*args, **kwargs):
+        time.sleep(1.0)
+        return _fake_llm_scores(*args, **kwargs)
+
+    monkeypatch.setattr(ensemble, "get_llm_scores", slow_llm)
+    start = time.monotonic()
+    recommendations = ensemble.ensemble_scores(
+        liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy", latency_budget=0.3
+    )
+    assert time.monotonic() - start < 0.9
+    assert recommendations.attrs["scorer_status"]["llm"] == "timeout"
+    assert "llm" not in recommendations.attrs["components"]
+    assert not recommendations["llm_score_component"].any()
+
+    without_llm = ensemble.ensemble_scores(liked_games=LIKED, attributes=ATTRIBUTES)
+    assert recommendations["bgg_id"].tolist() == without_llm["bgg_id"].tolist()
+
+
+def test_ranking_pages_follow_a_full_argsort(ensemble, rng):
+    scores = rng.random(ensemble.n_games)
+    scores[rng.random(ensemble.n_games) < 0.3] = 0.005
+    components = {name: scores / 3 for name in ("cf", "cbf", "llm")}
+    ranking = ensemble.Ranking(scores, components)
+
+    valid = np.flatnonzero(scores >= 0.01)
+    expected = valid[np.argsort(-scores[valid], kind="stable")]
+    assert len(ranking) == len(valid)
+
+    pages = [ranking.page(page, page_size=7) for page in range(4)]
+    np.testing.assert_array_equal(
+        np.concatenate([page["bgg_id"].to_numpy() for page in pages]), ensemble.catalog.bgg_ids[expected[:28]]
+    )
+    assert list(pages[2]["n_rank"]) == list(range(15, 22))
+    np.testing.assert_array_equal(ranking.top_rows(500), expected[:500])
+    np.testing.assert_array_equal(ranking.top_rows(len(valid) + 10), expected)
+    assert ranking.page(len(valid)).empty
+
+
+def test_ranking_pages_do_not_repeat_tied_games(ensemble):
+    rng = np.random.default_rng(141)
+    scores = np.where(rng.random(ensemble.n_games) < 0.01, 0.9, 0.5)
+    components = {name: scores / 3 for name in ("cf", "cbf", "llm")}
+    ranking = ensemble.Ranking(scores, components)
+
+    # "show more" extends the order page by page; ties keep their row order
+    rows = np.concatenate([ranking.top_rows(5 * (page + 1))[5 * page:] for page in range(60)])
+    np.testing.assert_array_equal(rows, np.lexsort((np.arange(ensemble.n_games), -scores))[:300])
+
+
+def test_first_page_matches_the_ranking(ensemble):
+    kwargs = dict(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy")
+    ranking = ensemble.ensemble_scores(**kwargs, return_ranking=True)
+    first_page = ensemble.ensemble_scores(**kwargs, n_recommendations=5)
+    assert first_page.equals(ranking.page(0, 5))
+    assert ranking.page(1, 5)["recommender_score"].max() <= first_page["recommender_score"].min()
+
+
+def test_batch_matches_single_requests(ensemble):
+    requests = [
+        {"liked_games": LIKED, "attributes": ATTRIBUTES},
+        {"liked_games": LIKED[:1], "exclude_games": [174430]},
+        {"attributes": {"game_mechanics": ["Dice Rolling"], "min_rating": [7.0]}},
+        {"liked_games": LIKED[2:], "disliked_games": LIKED[:1], "attributes": ATTRIBUTES},
+        {},
+    ]
+    batch = ensemble.ensemble_scores_batch(requests, n_recommendations=8, block_size=2)
+
+    for i, request in enumerate(requests):
+        single = ensemble.ensemble_scores(**request, n_recommendations=8, concurrent=False)
+        n = batch["n_results"][i]
+        assert n == len(single)
+        np.testing.assert_array_equal(batch["bgg_id"][i, :n], single["bgg_id"].to_numpy())
+        np.testing.assert_allclose(batch["recommender_score"][i, :n], single["recommender_score"], atol=1e-4)
+        np.testing.assert_allclose(batch["cf_score_component"][i, :n], single["cf_score_component"], atol=1e-4)
+        np.testing.assert_allclose(batch["cbf_score_component"][i, :n], single["cbf_score_component"], atol=1e-4)
+        assert (batch["bgg_id"][i, n:] == -1).all()
+
+
+def test_batch_matches_single_requests_over_one_candidate(ensemble, monkeypatch):
+    from types import SimpleNamespace
+
+    one_game = np.zeros(ensemble.n_games, dtype=bool)
+    one_game[1234] = True
+    monkeypatch.setattr(ensemble, "filter_engine", SimpleNamespace(mask=lambda attributes: one_game))
+    requests = [{"liked_games": LIKED}, {"attributes": ATTRIBUTES}, {}]
+    batch = ensemble.ensemble_scores_batch(requests, n_recommendations=3)
+
+    for i, request in enumerate(requests):
+        single = ensemble.ensemble_scores(**request, n_recommendations=3, concurrent=False)
+        n = batch["n_results"][i]
+        assert n == len(single) == 1
+        np.testing.assert_array_equal(batch["bgg_id"][i, :n], single["bgg_id"].to_numpy())
+        np.testing.assert_allclose(batch["recommender_score"][i, :n], single["recommender_score"], atol=1e-4)
+
+
+def test_batch_of_no_requests(ensemble):
+    result = ensemble.ensemble_scores_batch([], n_recommendations=3)
+    assert result["bgg_id"].shape == (0, 3) and result["n_results"].shape == (0,)
+
+
+def test_cached_results_match_uncached(ensemble):
+    from result_cache import ResultCache
+
+    cache = ResultCache()
+    kwargs = dict(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy", n_recommendations=6)
+    uncached = ensemble.ensemble_scores(**kwargs)
+    first = ensemble.cached_ensemble_scores(**kwargs, cache=cache)
+    first["name"] = "changed by the caller"
+    second = ensemble.cached_ensemble_scores(**dict(kwargs, liked_games=LIKED[::-1]), cache=cache)
+    assert second.equals(uncached)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    with pytest.raises(ValueError):
+        ensemble.cached_ensemble_scores(**kwargs, cache=cache, return_ranking=True)
+
+
+def test_results_with_a_dropped_scorer_are_not_cached(ensemble, monkeypatch):
+    from result_cache import ResultCache
+
+    def failing_llm(*args, **kwargs):
+        raise RuntimeError("no network")
+
+    monkeypatch.setattr(ensemble, "get_llm_scores", failing_llm)
+    cache = ResultCache()
+    recommendations = ensemble.cached_ensemble_scores(liked_games=LIKED, description="co-op fantasy", cache=cache)
+    assert recommendations.attrs["scorer_status"]["llm"] == "error"
+    assert cache.stats()["size"] == 0
+
+
+def test_component_store_matches_fresh_scoring(ensemble, monkeypatch):
+    from component_store import ComponentStore
+
+    calls = []
+
+    def counting_llm(*args, **kwargs):
+        calls.append(args)
+        return _fake_llm_scores(*args, **kwargs)
+
+    pool = ensemble.llm_candidate_rows(ensemble.filter_engine.mask(ATTRIBUTES))
+    narrower = dict(ATTRIBUTES, min_rating=[float(np.median(ensemble.catalog.columns["avg_rating"][pool]))])
+    requests = [
+        # (request, whether the LLM is asked)
+        (dict(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy"), True),
+        (dict(liked_games=LIKED, attributes=narrower, description="co-op fantasy"), False),
+        (dict(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op  fantasy", alpha=0.8, beta=0.1), False),
+        (dict(liked_games=LIKED[:2], attributes=ATTRIBUTES, description="co-op fantasy"), False),
+        # wider filters admit games the stored vector never scored
+        (dict(liked_games=LIKED, attributes=dict(ATTRIBUTES, players=[1, 6]), description="co-op fantasy"), True),
+        (dict(liked_games=LIKED, description="co-op fantasy"), True),
+    ]
+    store = ComponentStore()
+    monkeypatch.setattr(ensemble, "get_llm_scores", counting_llm)
+    for request, asks_llm in requests:
+        n_calls = len(calls)
+        with_store = ensemble.ensemble_scores(**request, n_recommendations=10, component_store=store)
+        assert len(calls) == n_calls + asks_llm
+        assert ("llm" in with_store.attrs["reused_components"]) != asks_llm
+        fresh = ensemble.ensemble_scores(**request, n_recommendations=10)
+
+        assert with_store["bgg_id"].tolist() == fresh["bgg_id"].tolist()
+        for column in ["recommender_score", "cf_score_component", "cbf_score_component", "llm_score_component"]:
+            np.testing.assert_allclose(with_store[column], fresh[column], atol=2e-4)
+    assert store.hits > 0
+
+
+def test_results_with_reused_components_are_not_cached(ensemble):
+    from component_store import ComponentStore
+    from result_cache import ResultCache
+
+    cache, store = ResultCache(), ComponentStore()
+    first = ensemble.cached_ensemble_scores(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy",
+                                            cache=cache, component_store=store)
+    assert first.attrs["reused_components"] == []
+    assert cache.stats()["size"] == 1
+
+    # the LLM vector of the first request is reused for the weight change, and only kept per session
+    reweighted = ensemble.cached_ensemble_scores(liked_games=LIKED, attributes=ATTRIBUTES, description="co-op fantasy",
+                                                 alpha=0.8, cache=cache, component_store=store)
+    assert reweighted.attrs["reused_components"] == ["cbf", "cf", "llm"]
+    assert cache.stats()["size"] == 1
+
+
+def _baseline_ensemble(ensemble, liked_games=None, disliked_games=None, exclude_games=None, attributes=None,
+                       description=None, alpha=0.5, beta=0.33, n_recommendations=5):
+    """
+    The original ensemble_scores on full-catalog scores: float32 CF fold-in, CBF and
+    LLM vectors, the same reweighting and pandas filters, and a full argsort.
+    Scores of filtered requests are renormalized over the surviving games, as the
+    scorers now only normalize over the candidates.
+    """
+    import cf
+    from cbf import get_cbf_scores
+    from test_filters import _pandas_mask
+
+    catalog = ensemble.catalog
+    games_df = catalog.frame(np.arange(catalog.n_games), ensemble.Ranking.columns + ["time_min", "time_max"])
+    mask = _pandas_mask(games_df, attributes or {})
+
+    V = np.asarray(cf.get_cf_store().V)
+    liked_rows = catalog.rows_for(liked_games or [])
+    cf_scores = np.zeros(catalog.n_games)
+    if len(liked_rows):
+        cf_scores = V.dot(cf.fold_in_implicit_user(V, liked_rows, alpha=5, lambda_=0.3))
+    cbf_scores = get_cbf_scores(attributes=attributes)
+    llm_scores = _fake_llm_scores(description or "", attributes=attributes)
+
+    def renormalize(scores):
+        if mask.all():
+            return scores
+        out = np.zeros(len(scores))
+        subset = scores[mask]
+        if subset.max() > subset.min():
+            out[mask] = (subset - subset.min()) / (subset.max() - subset.min())
+        elif len(subset) and scores.any():
+            out[mask] = 1
+        return out
+
+    if len(liked_rows):
+        cf_scores = (cf_scores - cf_scores.min()) / (cf_scores.max() - cf_scores.min())
+    cf_scores, cbf_scores = renormalize(cf_scores), renormalize(cbf_scores)
+
+    cf_zero, cbf_zero, llm_zero = (np.all(s == 0) for s in (cf_scores, cbf_scores, llm_scores))
+    if cf_zero and cbf_zero:
+        beta = 1.0
+    elif llm_zero:
+        beta = 0.0
+    if cf_zero and not cbf_zero:
+        alpha = 0.0
+    elif cbf_zero and not cf_zero:
+        alpha = 1.0
+
+    cf_component = cf_scores * alpha
+    cbf_component = cbf_scores * (1 - alpha)
+    final_scores = (cf_component + cbf_component) * (1 - beta) + llm_scores * beta
+    for gid in (liked_games or []) + (disliked_games or []) + (exclude_games or []):
+        if gid in games_df.index:
+            final_scores[games_df.index.get_loc(gid)] = 0
+    final_scores[~mask] = 0
+
+    valid_idx = np.where(final_scores >= 0.01)[0]
+    top_n_idx = valid_idx[np.argsort(final_scores[valid_idx])[::-1][:n_recommendations]]
+    return games_df.index[top_n_idx].to_numpy(), final_scores[top_n_idx]
+
+
+@pytest.mark.parametrize("request_kwargs", [
+    dict(liked_games=LIKED, description="co-op fantasy"),
+    dict(liked_games=LIKED, exclude_games=[174430, 161936], alpha=0.7),
+    dict(liked_games=LIKED[:1], attributes=ATTRIBUTES, description="co-op fantasy"),
+    dict(attributes={"game_mechanics": ["Dice Rolling"], "min_rating": [7.0]}, description="dice"),
+    dict(liked_games=LIKED, disliked_games=LIKED[:1], attributes=ATTRIBUTES, beta=0.5),
+])
+def test_matches_the_baseline_ensemble(ensemble, monkeypatch, request_kwargs):
+    import functools
+
+    import cf
+
+    # the baseline folded in and scored on the float32 embeddings
+    monkeypatch.setattr(ensemble, "get_cf_scores", functools.partial(cf.get_cf_scores, quantized=False))
+    expected_ids, expected_scores = _baseline_ensemble(ensemble, **request_kwargs, n_recommendations=20)
+    recommendations = ensemble.ensemble_scores(**request_kwargs, n_recommendations=20)
+
+    assert recommendations["bgg_id"].tolist() == expected_ids.tolist()
+    np.testing.assert_allclose(recommendations["recommender_score"], expected_scores, atol=1e-4)
+
+
+def test_a_single_surviving_game_is_recommended(ensemble, monkeypatch):
+    class OneGameFilter:
+        def mask(self, attributes):
+            mask = np.zeros(ensemble.n_games, dtype=bool)
+            mask[1234] = True
+            return mask
+
+    # constant CF / CBF scores over one candidate rank it first instead of zeroing it out
+    monkeypatch.setattr(ensemble, "filter_engine", OneGameFilter())
+    for kwargs in (dict(liked_games=LIKED), dict(attributes=ATTRIBUTES), dict(liked_games=LIKED, attributes=ATTRIBUTES)):
+        recommendations = ensemble.ensemble_scores(**kwargs)
+        assert recommendations["bgg_id"].tolist() == [ensemble.catalog.bgg_ids[1234]]
+        assert recommendations["recommender_score"].iloc[0] == 1
+
+
+def test_a_single_surviving_game_is_recommended_from_stored_components(ensemble, monkeypatch):
+    from types import SimpleNamespace
+
+    from component_store import ComponentStore
+
+    one_game = np.zeros(ensemble.n_games, dtype=bool)
+    one_game[1234] = True
+    store = ComponentStore()
+    ensemble.ensemble_scores(liked_games=LIKED, attributes=ATTRIBUTES, component_store=store)
+
+    # the stored full-catalog CF / CBF vectors are constant over the one candidate
+    monkeypatch.setattr(ensemble, "filter_engine", SimpleNamespace(mask=lambda attributes: one_game))
+    recommendations = ensemble.ensemble_scores(liked_games=LIKED, attributes=ATTRIBUTES, component_store=store)
+    assert {"cf", "cbf"} <= set(recommendations.attrs["reused_components"])
+    assert recommendations["bgg_id"].tolist() == [ensemble.catalog.bgg_ids[1234]]
+    assert recommendations["recommender_score"].iloc[0] == 1
+
+
+def test_quantized_cf_keeps_the_baseline_top_games(ensemble):
+    expected_ids, _ = _baseline_ensemble(ensemble, liked_games=LIKED, n_recommendations=20)
+    recommendations = ensemble.ensemble_scores(liked_games=LIKED, n_recommendations=20)
+    assert len(set(recommendations["bgg_id"]) & set(expected_ids)) >= 18
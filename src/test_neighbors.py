@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import neighbors
+
+
+def _brute_force(feature_sets, weights):
+    normalized = [X / np.linalg.norm(X, axis=1, keepdims=True) for X in feature_sets]
+    sim = sum(w * (X @ X.T) for X, w in zip(normalized, weights))
+    np.fill_diagonal(sim, -np.inf)
+    return sim
+
+
+def test_top_k_neighbors_matches_brute_force(rng):
+    feature_sets = [rng.standard_normal((120, 8)), rng.random((120, 5))]
+    weights = [0.5, 0.5]
+    sim = _brute_force(feature_sets, weights)
+
+    indptr, indices, scores = neighbors.top_k_neighbors(feature_sets, weights, k=10, block_size=32)
+    for row in range(120):
+        expected = np.sort(sim[row])[::-1][:10]
+        expected = expected[expected > 0]
+        got = scores[indptr[row]:indptr[row + 1]].astype(np.float32)
+        np.testing.assert_allclose(got, expected, atol=2e-3)
+        np.testing.assert_allclose(sim[row, indices[indptr[row]:indptr[row + 1]]], got, atol=2e-3)
+        assert row not in indices[indptr[row]:indptr[row + 1]]
+
+
+def _small_table():
+    # row 0 -> rows 1, 2; row 1 -> rows 2, 0; row 2 -> row 3; row 3 has no neighbors
+    return neighbors.NeighborTable(
+        bgg_ids=np.array([40, 10, 30, 20]),
+        indptr=np.array([0, 2, 4, 5, 5]),
+        indices=np.array([1, 2, 2, 0, 3], dtype=np.int32),
+        scores=np.array([0.9, 0.5, 0.8, 0.7, 0.6], dtype=np.float16),
+    )
+
+
+def test_similar_to_merges_seed_lists_and_excludes_seeds():
+    table = _small_table()
+
+    ids, scores = table.similar_to([40])
+    assert list(ids) == [10, 30]
+
+    ids, scores = table.similar_to([40, 10])
+    assert list(ids) == [30]
+    np.testing.assert_allclose(scores, [1.3], atol=1e-3)
+
+    ids, scores = table.similar_to([999])
+    assert len(ids) == 0 and len(scores) == 0
+
+
+def test_neighbor_table_save_load_roundtrip(tmp_path):
+    table = _small_table()
+    table.save(tmp_path / "blend")
+    loaded = neighbors.NeighborTable.load(tmp_path / "blend")
+
+    for name in ["bgg_ids", "indptr", "indices", "scores"]:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(table, name))
+    assert list(loaded.similar_to([40, 10])[0]) == [30]
+
+
+def test_get_neighbor_table_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        neighbors.get_neighbor_table("nope")
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import cbf_bundle
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "pre_compute_CBF_data.py")
+
+
+def _games(rng, n_games=30):
+    categories = ["Fantasy", "Wargame", "Economic", "Party"]
+    mechanics = ["Dice Rolling", "Trading", "Worker Placement"]
+    return pd.DataFrame({
+        "bgg_id": rng.permutation(np.arange(1, n_games + 1) * 7),
+        "name": [f"Game {i}" for i in range(n_games)],
+        "description": "",
+        "image": "",
+        "thumbnail": "",
+        "bgg_link": "",
+        "avg_rating": rng.uniform(5, 9, n_games),
+        "bgg_rating": rng.uniform(5, 9, n_games),
+        "users_rated": rng.integers(10, 1000, n_games),
+        "game_weight": np.r_[1.0, 5.0, rng.uniform(1.5, 4.5, n_games - 2)],
+        "players_min": 1,
+        "players_max": 6,
+        "players_best": np.r_[2.0, 5.0, rng.integers(2, 5, n_games - 2)],
+        "time_min": 30,
+        "time_max": 120,
+        "time_avg": np.r_[20, 240, rng.integers(30, 200, n_games - 2)],
+        "simple_game_mechanics": [mechanics[i % 3] for i in range(n_games)],
+        "simple_game_categories": [";".join(categories[i % 4:i % 4 + 2]) for i in range(n_games)],
+        "game_types": ["Thematic" if i % 2 else "Family" for i in range(n_games)],
+        "year_published": 2000,
+    })
+
+
+def _run(cwd, *args):
+    result = subprocess.run([sys.executable, SCRIPT, *args], cwd=cwd, capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def _write_games(cwd, games):
+    os.makedirs(cwd / "data", exist_ok=True)
+    games.to_csv(cwd / "data" / "games_master_data.csv", index=False)
+
+
+def test_incremental_rebuild_matches_full_rebuild(tmp_path, rng):
+    games = _games(rng)
+    incremental_dir, full_dir = tmp_path / "incremental", tmp_path / "full"
+    _write_games(incremental_dir, games)
+    _run(incremental_dir)
+
+    # one game changes labels and numeric inputs within the existing vocabulary and range
+    games.loc[5, ["simple_game_mechanics", "game_weight", "time_avg"]] = ["Trading;Dice Rolling", 3.3, 75]
+    _write_games(incremental_dir, games)
+    _write_games(full_dir, games)
+    assert "Re-encoded 1 new or changed games" in _run(incremental_dir, "--incremental")
+    assert "Encoded all 30 games" in _run(full_dir)
+
+    incremental = cbf_bundle.load_cbf_bundle(str(incremental_dir / "data" / "precomputed_CBF"))
+    full = cbf_bundle.load_cbf_bundle(str(full_dir / "data" / "precomputed_CBF"))
+    np.testing.assert_array_equal(incremental.bgg_ids, np.sort(games["bgg_id"]))
+    np.testing.assert_array_equal(incremental.bgg_ids, full.bgg_ids)
+    np.testing.assert_array_equal(incremental.fingerprints, full.fingerprints)
+    np.testing.assert_allclose(incremental.features_csr.toarray(), full.features_csr.toarray(), atol=1e-7)
+    np.testing.assert_allclose(incremental.numeric_features, full.numeric_features, atol=1e-7)
+
+
+def test_incremental_rebuild_falls_back_on_a_new_label(tmp_path, rng):
+    games = _games(rng)
+    _write_games(tmp_path, games)
+    _run(tmp_path)
+
+    games.loc[0, "simple_game_categories"] = "Space Exploration"
+    _write_games(tmp_path, games)
+    assert "Label vocabulary changed, doing a full rebuild." in _run(tmp_path, "--incremental")
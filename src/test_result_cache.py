@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, request_key
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, "time", clock.time)
+    return clock
+
+
+def test_request_key_is_canonical():
+    key = request_key(
+        [3, 1, 1], None, [], {"game_categories": ["Fantasy ", "Adventure"], "players": [2, 4], "game_types": []},
+        "  co-op   fantasy ",
+    )
+    assert key == request_key(
+        [1, 3], [], None, {"players": (2.0, 4.0), "game_categories": ["Adventure", "Fantasy", ""]}, "co-op fantasy",
+    )
+    assert key != request_key([1, 3], description="co-op fantasy")
+    assert key != request_key([3, 1, 1], None, [], {"game_categories": ["Fantasy", "Adventure"], "players": [2, 4]},
+                              "co-op fantasy", n_recommendations=10)
+    assert request_key([1], version="a") != request_key([1], version="b")
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResultCache(ttl=10)
+    cache.set("a", 1)
+    clock.now += 9
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a", "missing") == "missing"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "size": 0}
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResultCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_disk_entries_survive_a_restart_and_expire(tmp_path, clock):
+    ResultCache(ttl=10, disk_dir=str(tmp_path)).set("a", {"x": [1, 2]})
+
+    restarted = ResultCache(ttl=10, disk_dir=str(tmp_path))
+    assert restarted.get("a") == {"x": [1, 2]}
+    assert restarted.stats()["size"] == 1
+
+    clock.now += 11
+    assert ResultCache(ttl=10, disk_dir=str(tmp_path)).get("a") is None
+    assert not os.listdir(tmp_path)
+
+
+def test_disk_reads_respect_max_size(tmp_path, clock):
+    writer = ResultCache(max_size=10, disk_dir=str(tmp_path))
+    for key in "abcd":
+        writer.set(key, key)
+
+    reader = ResultCache(max_size=2, disk_dir=str(tmp_path))
+    for key in "abcd":
+        assert reader.get(key) == key
+    assert reader.stats()["size"] == 2
+
+
+def test_disk_tier_is_pruned_to_max_size(tmp_path, clock):
+    cache = ResultCache(max_size=3, disk_dir=str(tmp_path), prune_every=4)
+    for i, key in enumerate("abc"):
+        cache.set(key, key)
+        os.utime(tmp_path / f"{key}.pkl", (i, i))
+    cache.set("d", "d")
+    assert sorted(os.listdir(tmp_path)) == ["b.pkl", "c.pkl", "d.pkl"]
+
+    cache.clear()
+    assert not os.listdir(tmp_path)
+    assert cache.stats()["size"] == 0